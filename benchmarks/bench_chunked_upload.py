@@ -0,0 +1,50 @@
+"""Measure end-to-end upload time of a large report for several chunk sizes and upload worker counts.
+
+Runs against the Flask stand-in from tests/mock_server.py, which parses every posted body and
+simulates LATENCY seconds of network round trip and server side processing per request.
+
+Usage::
+
+    python benchmarks/bench_chunked_upload.py [NUMBER_OF_TESTS]
+"""
+import sys
+import time
+from pathlib import Path
+
+from flask import jsonify, request
+
+from pytest_jira_xray.constants import DC_ENDPOINT
+from pytest_jira_xray.xray_publisher import XrayPublisher
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'tests'))
+from mock_server import MockServer  # noqa: E402
+
+
+LATENCY = 0.05
+
+
+def main(count: int) -> None:
+    server = MockServer()
+
+    def import_execution():
+        request.get_json()
+        time.sleep(LATENCY)
+        return jsonify({'testExecIssue': {'key': 'JIRA-1'}})
+
+    server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    server.start()
+    report = {'info': {'summary': 'Benchmark'},
+              'tests': [{'testKey': f'JIRA-{i}', 'status': 'PASS', 'comment': 'x' * 200} for i in range(count)]}
+
+    for chunk_size, upload_workers in ((0, 1), (10_000, 1), (1000, 1), (1000, 4), (1000, 8), (100, 1), (100, 8)):
+        publisher = XrayPublisher(server.url, DC_ENDPOINT, ('user', 'password'), chunk_size=chunk_size,
+                                  upload_workers=upload_workers)
+        start = time.perf_counter()
+        publisher.publish(report)
+        elapsed = time.perf_counter() - start
+        publisher.close()
+        print(f'chunk size {chunk_size or "unbounded":>9}, {upload_workers} worker(s): {elapsed * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
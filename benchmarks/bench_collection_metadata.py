@@ -0,0 +1,90 @@
+"""Measure looking up the Xray metadata of the test items of a large collection.
+
+The markers and the docstring used to be looked up for each of the three phase reports of a test.
+The markers and parameters are now looked up once per item after collection and read from the item
+stash by the reports, the docstring, which no output uses, is not looked up at all.
+
+Usage::
+
+    python benchmarks/bench_collection_metadata.py [NUMBER_OF_ITEMS]
+"""
+import gc
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from pytest_jira_xray.helper import collect_metadata, get_parameters, get_test_keys
+
+TEST_MODULE = '''
+import pytest
+
+pytestmark = [pytest.mark.integration, pytest.mark.filterwarnings('ignore::DeprecationWarning')]
+
+
+@pytest.mark.xray('JIRA-1')
+class TestCollection:
+
+    @pytest.mark.requirement('JIRA-2')
+    @pytest.mark.parametrize('value', range({count}))
+    def test_value(self, value):
+        """
+        Check a single value.
+        """
+'''
+
+
+def lookup_per_report(items) -> None:
+    for item in items:
+        for when in ('setup', 'call', 'teardown'):
+            [test_key for marker in item.iter_markers(name='xray') for test_key in marker.args]
+            node = item.obj
+            node.__doc__.strip() if node.__doc__ else node.__name__
+            if when == 'setup':
+                {name: str(value) for name, value in item.callspec.params.items()}
+
+
+def lookup_once(items) -> None:
+    for item in items:
+        collect_metadata(item)
+    for item in items:
+        # only the setup report carries the metadata
+        get_test_keys(item)
+        get_parameters(item)
+
+
+class Benchmark:
+
+    def __init__(self, name, lookup):
+        self.name = name
+        self.lookup = lookup
+
+    def pytest_collection_finish(self, session) -> None:
+        items = session.items
+        for item in items:
+            # pytest binds the test function when running the test anyway, it is not part of the lookup
+            item.obj
+        gc.collect()
+        gc.disable()  # as timeit does, a collection of the large item graph would dominate the timing
+        start = time.perf_counter()
+        self.lookup(items)
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        print(f'{self.name:>14}: {elapsed:6.2f} s, {elapsed / len(items) * 1e6:6.2f} us per item')
+
+
+def main(count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        test_file = Path(directory) / 'test_collection.py'
+        test_file.write_text(TEST_MODULE.format(count=count))
+        print(f'{count} items')
+        # each lookup on a fresh collection, so neither benefits from attributes cached by the other
+        for name, lookup in (('per report', lookup_per_report), ('once per item', lookup_once)):
+            pytest.main(['--collect-only', '-p', 'no:cacheprovider', '-p', 'no:terminal', str(test_file)],
+                        plugins=[Benchmark(name, lookup)])
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
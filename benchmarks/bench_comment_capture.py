@@ -0,0 +1,56 @@
+"""Measure time, peak memory and comment size of capturing a long failure text.
+
+A failure raised DEPTH frames deep is rendered into the comment in full and then sliced, as
+before, and through the bounded capture of CommentPolicy in each truncation mode.
+
+Usage::
+
+    python benchmarks/bench_comment_capture.py [DEPTH]
+"""
+import sys
+import time
+import tracemalloc
+
+from _pytest._code import ExceptionInfo
+from _pytest.reports import TestReport
+
+from pytest_jira_xray.comment_policy import CommentPolicy
+from pytest_jira_xray.constants import MAX_COMMENT_LENGTH
+
+
+def recurse(depth: int, payload: str) -> None:
+    if depth:
+        recurse(depth - 1, payload)
+    assert payload == 'expected'
+
+
+def failure_report(depth: int) -> TestReport:
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), depth + 100))
+    try:
+        recurse(depth, 'x' * 1000)
+    except AssertionError:
+        longrepr = ExceptionInfo.from_current().getrepr(style='long', showlocals=True)
+    return TestReport('test_a.py::test_a', ('test_a.py', 1, 'test_a'), {}, 'failed', longrepr, 'call')
+
+
+def measure(name: str, capture) -> None:
+    start = time.perf_counter()
+    text = capture()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    capture()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:>12}: {elapsed * 1000:8.1f} ms, peak {peak / 1024:8.0f} KiB, comment {len(text):>8} characters')
+
+
+def main(depth: int) -> None:
+    report = failure_report(depth)
+    measure('full text', lambda: report.longreprtext[:MAX_COMMENT_LENGTH])
+    for truncation in ('head', 'tail', 'both'):
+        policy = CommentPolicy(truncation=truncation)
+        measure(truncation, lambda: policy.render(report))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
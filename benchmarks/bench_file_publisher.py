@@ -0,0 +1,47 @@
+"""Compare write time and file size of the JSON report across the FilePublisher output modes.
+
+Usage::
+
+    python benchmarks/bench_file_publisher.py [NUMBER_OF_TESTS]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pytest_jira_xray.file_publisher import FilePublisher
+
+
+def build_report(count: int) -> dict:
+    tests = []
+    for i in range(count):
+        test = {'testKey': f'JIRA-{i}', 'status': 'PASS' if i % 3 else 'FAIL'}
+        if not i % 3:
+            test['comment'] = f'def test_{i}():\n>       assert False\nE       assert False\n\ntest_module.py:{i}: ' \
+                              'AssertionError'
+        tests.append(test)
+    return {'testExecutionKey': 'JIRA-1', 'info': {'summary': 'Benchmark'}, 'tests': tests}
+
+
+def main(count: int) -> None:
+    report = build_report(count)
+    suffixes = ('.json', '.json.gz', '.json.bz2', '.json.xz')
+    modes = [(suffix, compact) for suffix in suffixes for compact in (False, True)]
+    try:
+        import zstandard  # noqa: F401
+        modes += [('.json.zst', False), ('.json.zst', True)]
+    except ImportError:
+        pass
+    with tempfile.TemporaryDirectory() as directory:
+        for suffix, compact in modes:
+            path = Path(directory, f'report{suffix}')
+            publisher = FilePublisher(str(path), compact=compact)
+            start = time.perf_counter()
+            publisher.publish(report)
+            elapsed = time.perf_counter() - start
+            mode = 'compact' if compact else 'indented'
+            print(f'{suffix:<10} {mode:<9} {elapsed * 1000:8.1f} ms {path.stat().st_size / 1024:10.1f} KiB')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
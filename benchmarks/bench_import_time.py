@@ -0,0 +1,45 @@
+"""Measure the import time of the plugin module, which pytest imports in every session it is installed in.
+
+requests and the publisher are only imported once results are uploaded to a --jira-url server. The
+import of the plugin alone is compared with the import including the publisher, as before.
+pytest itself is imported first in all cases, as it is when pytest loads the plugin. The figures are
+the best cumulative -X importtime of the modules imported after pytest, so they leave out the import of
+pytest that the plain ``python -X importtime -c 'import pytest_jira_xray.plugin'`` output includes.
+
+Usage::
+
+    python benchmarks/bench_import_time.py [REPEAT]
+"""
+import subprocess
+import sys
+
+VARIANTS = (
+    ('plugin', 'import pytest_jira_xray.plugin'),
+    ('with publisher', 'import pytest_jira_xray.plugin, pytest_jira_xray.xray_publisher'),
+)
+
+
+def import_time(statement: str) -> float:
+    """Return the cumulative import time, in seconds, of all modules imported by the statement."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import pytest; {statement}'],
+                            check=True, capture_output=True, text=True)
+    total = 0
+    after_pytest = False
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        # only top level imports after pytest, the cumulative time covers the nested ones
+        if not name.startswith('  '):
+            if after_pytest:
+                total += int(cumulative)
+            after_pytest = after_pytest or name.strip() == 'pytest'
+    return total / 1e6
+
+
+def main(repeat: int) -> None:
+    for name, statement in VARIANTS:
+        elapsed = min(import_time(statement) for _ in range(repeat))
+        print(f'{name:>14}: {elapsed * 1000:6.1f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,54 @@
+"""Measure the overhead of the installed plugin on a test session.
+
+A module of trivial tests is run in a subprocess without the plugin, with the plugin installed but
+not enabled, and with a JSON report. The best of REPEAT runs is shown, including interpreter startup.
+
+Usage::
+
+    python benchmarks/bench_plugin_overhead.py [NUMBER_OF_TESTS] [REPEAT]
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TEST_MODULE = '''
+import pytest
+
+
+@pytest.mark.xray('JIRA-1')
+@pytest.mark.parametrize('value', range({count}))
+def test_value(value):
+    """Check a single value."""
+'''
+
+VARIANTS = (
+    ('not installed', ['-p', 'no:xray']),
+    ('disabled', []),
+    ('--xray-json', ['--xray-json=report.json', '--execution=JIRA-1000']),
+)
+
+
+def run(directory: str, options: list) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', *options],
+                   cwd=directory, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main(count: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        Path(directory, 'test_overhead.py').write_text(TEST_MODULE.format(count=count))
+        # the variants take turns, so a change of machine load affects all of them alike
+        timings = {name: float('inf') for name, _ in VARIANTS}
+        for _ in range(repeat):
+            for name, options in VARIANTS:
+                timings[name] = min(timings[name], run(directory, options))
+        reference = timings[VARIANTS[0][0]]
+        for name, elapsed in timings.items():
+            print(f'{name:>14}: {elapsed:6.2f} s, {(elapsed - reference) / count * 1e6:+6.1f} us per test')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
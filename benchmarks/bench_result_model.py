@@ -0,0 +1,37 @@
+"""Measure the memory footprint of the Xray result model per test.
+
+Usage::
+
+    python benchmarks/bench_result_model.py [NUMBER_OF_TESTS]
+"""
+import gc
+import sys
+import tracemalloc
+
+from pytest_jira_xray.xray_result import XrayTest, XrayTestInfo
+
+
+def build_tests(count: int) -> list:
+    tests = []
+    for i in range(count):
+        if i % 2:
+            tests.append(XrayTest(test_key=f'JIRA-{i}', status='PASS'))
+        else:
+            tests.append(XrayTest(test_info=XrayTestInfo(definition=f'test_module.py::test_{i}'), status='FAIL',
+                                  comment='assert False'))
+    return tests
+
+
+def main(count: int) -> None:
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tests = build_tests(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{count} tests: {(current - baseline) / count:.1f} bytes per test')
+    del tests
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,72 @@
+"""Compare encoding a synthetic report for the report file and the upload, once per output or once for both.
+
+The baseline encodes the report twice with the json module, as the report file and the upload did before
+they shared the JsonSerializer. Each available backend then encodes the tests once and joins the same
+bytes into the report file and the request body.
+
+Usage::
+
+    python benchmarks/bench_serializer.py [NUMBER_OF_TESTS]
+"""
+import json
+import sys
+import time
+
+from pytest_jira_xray.evidence import json_default
+from pytest_jira_xray.serializer import JSON_BACKENDS, JsonSerializer, join_report
+
+
+def build_report(count: int) -> dict:
+    tests = []
+    for i in range(count):
+        test = {'testKey': f'JIRA-{i}', 'start': '2024-01-01T12:00:00+0000', 'finish': '2024-01-01T12:00:01+0000',
+                'status': 'PASSED' if i % 3 else 'FAILED'}
+        if not i % 3:
+            test['comment'] = f'def test_{i}():\n>       assert False\nE       assert False\n\ntest_module.py:{i}: ' \
+                              'AssertionError'
+        if not i % 5:
+            test['iterations'] = [{'name': f'param{j}', 'parameters': [{'name': 'param', 'value': str(j)}],
+                                   'status': 'PASSED'} for j in range(3)]
+        tests.append(test)
+    return {'testExecutionKey': 'JIRA-1', 'info': {'summary': 'Benchmark'}, 'tests': tests}
+
+
+def encode_twice(report: dict) -> tuple:
+    report_file = json.dumps(report, default=json_default, separators=(',', ':')).encode('utf-8')
+    request_body = json.dumps(report, default=json_default).encode('utf-8')
+    return report_file, request_body
+
+
+def encode_once(serializer: JsonSerializer, report: dict) -> tuple:
+    header = serializer.dumps({name: value for name, value in report.items() if name != 'tests'})
+    tests = [serializer.dumps(test) for test in report['tests']]
+    body = join_report(header, tests)
+    return body, body
+
+
+def best_of(repeat: int, function, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(count: int) -> None:
+    report = build_report(count)
+    baseline = best_of(5, encode_twice, report)
+    print(f'{"json, encoded twice":<22} {baseline * 1000:8.1f} ms')
+    for backend in JSON_BACKENDS[1:]:
+        try:
+            serializer = JsonSerializer(backend)
+        except ImportError:
+            print(f'{backend + ", encoded once":<22} not installed')
+            continue
+        assert json.loads(encode_once(serializer, report)[0]) == report
+        elapsed = best_of(5, encode_once, serializer, report)
+        print(f'{backend + ", encoded once":<22} {elapsed * 1000:8.1f} ms {baseline / elapsed:6.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
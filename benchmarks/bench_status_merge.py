@@ -0,0 +1,36 @@
+"""Measure merging of test statuses, pairwise and in bulk.
+
+The list based merge, which searched STATUS_HIERARCHY for both statuses, is kept here as the reference.
+
+Usage::
+
+    python benchmarks/bench_status_merge.py [NUMBER_OF_MERGES]
+"""
+import random
+import sys
+import time
+from functools import reduce
+
+from pytest_jira_xray.helper import _merge_status
+from pytest_jira_xray.xray_statuses import STATUS_HIERARCHY, merge_statuses
+
+
+def _merge_status_by_index(status_1, status_2):
+    return STATUS_HIERARCHY[max(STATUS_HIERARCHY.index(status_1), STATUS_HIERARCHY.index(status_2))]
+
+
+def main(count: int) -> None:
+    random.seed(0)
+    # mostly passing tests, as in a healthy test suite
+    statuses = random.choices(STATUS_HIERARCHY, weights=(90, 4, 0, 0, 4, 1, 1), k=count)
+    for name, merge in (('index lookup', lambda: reduce(_merge_status_by_index, statuses)),
+                        ('rank table', lambda: reduce(_merge_status, statuses)),
+                        ('merge_statuses', lambda: merge_statuses(statuses))):
+        start = time.perf_counter()
+        merged = merge()
+        elapsed = time.perf_counter() - start
+        print(f'{name:>14}: {elapsed * 1e9 / count:6.1f} ns per merge ({merged.value})')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
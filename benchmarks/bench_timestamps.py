@@ -0,0 +1,34 @@
+"""Compare formatting the start and finish of every test with a new datetime against the cached format_timestamp.
+
+The timestamps of a synthetic run of NUMBER_OF_TESTS tests finishing within DURATION seconds are formatted
+with DATETIME_FORMAT in the local timezone.
+
+Usage::
+
+    python benchmarks/bench_timestamps.py [NUMBER_OF_TESTS] [DURATION]
+"""
+import sys
+import time
+from datetime import datetime
+
+from pytest_jira_xray.constants import DATETIME_FORMAT
+from pytest_jira_xray.helper import format_timestamp
+
+
+def format_with_datetime(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).astimezone().strftime(DATETIME_FORMAT)
+
+
+def main(count: int, duration: float) -> None:
+    begin = time.time()
+    timestamps = [begin + duration * i / count for i in range(count)]
+    for name, format_function in (('datetime per test', format_with_datetime), ('format_timestamp', format_timestamp)):
+        start = time.perf_counter()
+        formatted = [format_function(timestamp) for timestamp in timestamps]
+        elapsed = time.perf_counter() - start
+        assert formatted[-1] == format_with_datetime(timestamps[-1])
+        print(f'{name:<18} {elapsed * 1000:8.1f} ms {elapsed / count * 1e9:8.0f} ns per test')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, float(sys.argv[2]) if len(sys.argv) > 2 else 600.0)
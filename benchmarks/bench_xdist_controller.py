@@ -0,0 +1,64 @@
+"""Measure the work done by the pytest-xdist controller per test result for several worker counts.
+
+Worker reports are serialized as xdist sends them and replayed on the controller, interleaved
+between the workers. Reports which were folded on the worker ("pre-aggregated") are compared
+with plain reports that the controller has to fold itself ("per-phase").
+
+Usage::
+
+    python benchmarks/bench_xdist_controller.py [NUMBER_OF_TESTS]
+"""
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from _pytest.reports import TestReport
+
+from pytest_jira_xray.plugin import pytest_xray_status_mapping
+from pytest_jira_xray.xray_report import XrayReport
+from pytest_jira_xray.xray_worker import XrayWorker
+
+
+def worker_reports(worker_index: int, count: int, pre_aggregated: bool) -> list:
+    """Serialized setup/call/teardown reports of all tests run by a single worker."""
+    worker = XrayWorker()
+    serialized = []
+    for i in range(count):
+        nodeid = f'test_module_{worker_index}.py::test_{i}'
+        for when in ('setup', 'call', 'teardown'):
+            failed = when == 'call' and i % 10 == 0
+            report = TestReport(nodeid, (nodeid, i, f'test_{i}'), {}, 'failed' if failed else 'passed',
+                                'assert False' if failed else None, when, duration=0.001,
+                                test_keys=[f'JIRA-{i}'])
+            if pre_aggregated:
+                worker.pytest_runtest_logreport(report)
+            serialized.append(json.dumps(report._to_json()))
+    return serialized
+
+
+def run_controller(workers: list) -> tuple:
+    reports = [TestReport._from_json(json.loads(serialized)) for batch in zip(*workers) for serialized in batch]
+    xray_report = XrayReport(file_path='report.json')
+    xray_report._config = SimpleNamespace(hook=SimpleNamespace(pytest_xray_status_mapping=pytest_xray_status_mapping))
+    start = time.perf_counter()
+    for report in reports:
+        xray_report.pytest_runtest_logreport(report)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(xray_report._xray_tests)
+
+
+def main(count: int) -> None:
+    for worker_count in (1, 4, 16, 32, 64):
+        per_worker = count // worker_count
+        for pre_aggregated in (False, True):
+            workers = [worker_reports(index, per_worker, pre_aggregated) for index in range(worker_count)]
+            payload = sum(len(serialized) for reports in workers for serialized in reports)
+            elapsed, results = run_controller(workers)
+            mode = 'pre-aggregated' if pre_aggregated else 'per-phase'
+            print(f'{worker_count:>2} worker(s), {mode:>14}: {elapsed * 1e6 / results:6.1f} us per test, '
+                  f'{payload / results:6.0f} bytes sent per test')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32_000)
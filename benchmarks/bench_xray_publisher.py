@@ -0,0 +1,49 @@
+"""Compare uploads through a new connection per request with the pooled XrayPublisher session.
+
+Runs against the Flask stand-in from tests/mock_server.py. The werkzeug development server closes
+every connection after responding, so locally this only shows the session overhead; against a real
+Jira server the pooled session additionally skips the TCP and TLS handshake of every request.
+
+Usage::
+
+    python benchmarks/bench_xray_publisher.py [NUMBER_OF_REQUESTS]
+"""
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+from pytest_jira_xray.constants import DC_ENDPOINT
+from pytest_jira_xray.xray_publisher import XrayPublisher
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'tests'))
+from mock_server import MockServer  # noqa: E402
+
+REPORT = {'testExecutionKey': 'JIRA-1', 'tests': [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(100)]}
+
+
+def main(count: int) -> None:
+    server = MockServer()
+    server.add_json_response(DC_ENDPOINT, {'testExecIssue': {'key': 'JIRA-1'}}, methods=('POST',))
+    server.start()
+    url = server.url + DC_ENDPOINT
+
+    start = time.perf_counter()
+    for _ in range(count):
+        requests.request('POST', url, json=REPORT, auth=('user', 'password')).raise_for_status()
+    unpooled = time.perf_counter() - start
+
+    publisher = XrayPublisher(server.url, DC_ENDPOINT, ('user', 'password'))
+    start = time.perf_counter()
+    for _ in range(count):
+        publisher.publish(REPORT)
+    pooled = time.perf_counter() - start
+    publisher.close()
+
+    print(f'requests.request: {unpooled / count * 1000:.2f} ms per upload')
+    print(f'XrayPublisher:    {pooled / count * 1000:.2f} ms per upload')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,162 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Union
+
+from .constants import DEFAULT_FLUSH_COUNT, DEFAULT_FLUSH_INTERVAL
+from .exceptions import XrayChunkError, XrayError
+from .xray_publisher import XrayPublisher
+
+_logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BackgroundPublisher:
+    """
+    Upload test results from a background thread while the test session is running.
+
+    Queued results are sent whenever flush_count results are waiting or flush_interval seconds
+    have passed since the last upload. The first upload creates the test execution unless the
+    report header already names one, all following uploads add their results to it. Results of
+    a failed upload are kept and sent again with the next one, unless the publisher spooled them
+    to its outbox. Of an upload whose first chunk created the test execution only the results
+    of the failed chunks are kept. Whatever was not uploaded, e.g. because the thread stopped on an unexpected error,
+    is reported by close.
+    """
+
+    def __init__(
+        self,
+        publisher: XrayPublisher,
+        header: Callable[[], dict],
+        flush_count: int = DEFAULT_FLUSH_COUNT,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ) -> None:
+        self.publisher = publisher
+        self.header = header
+        self.flush_count = max(flush_count, 1)
+        self.flush_interval = flush_interval
+        self.issue_key: Optional[str] = None
+        self.exception: Optional[Exception] = None
+        self.spool_errors: List[Exception] = []
+        # results that could not be encoded, e.g. because a spooled evidence file could not be read
+        self.lost = 0
+        self.lost_exception: Optional[Exception] = None
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: List[bytes] = []
+        self._thread = threading.Thread(target=self._run, name='xray-background-publisher', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def put(self, test_data: Union[dict, bytes]) -> None:
+        """Queue a single finished test result for upload, optionally encoded by the serializer of the publisher."""
+        self._queue.put(test_data)
+
+    def close(self) -> Optional[str]:
+        """
+        Upload all remaining results, stop the background thread and return the test execution key.
+
+        :raise XrayError: if the remaining results could not be uploaded
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        # results queued after the thread stopped were never taken from the queue
+        left = len(self._pending) + self._discard_queued()
+        if self.exception is not None or left:
+            reason = f': {self.exception}' if self.exception is not None else ''
+            raise XrayError(f'{left} test result(s) were not uploaded{reason}') from self.exception
+        if self.lost:
+            raise XrayError(f'{self.lost} test result(s) could not be encoded: {self.lost_exception}') \
+                from self.lost_exception
+        if self.spool_errors:
+            raise XrayError('\n'.join(str(exc) for exc in self.spool_errors))
+        return self.issue_key
+
+    def _discard_queued(self) -> int:
+        count = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return count
+            if item is not _STOP:
+                count += 1
+
+    def _flush(self, final: bool = False) -> None:
+        if not self._pending and not final:
+            return
+        header = self.header()
+        if self.issue_key and not final:
+            # The test execution info has been sent already, only the final upload updates it
+            header = {'testExecutionKey': self.issue_key}
+        elif self.issue_key:
+            header['testExecutionKey'] = self.issue_key
+        try:
+            self.issue_key = self.publisher.publish_encoded(header, self._pending)
+        except XrayChunkError as exc:
+            # the test execution exists now, only the results of the failed chunks are left
+            self.issue_key = exc.key
+            self._upload_failed(exc, exc.failed_tests)
+            return
+        except (ValueError, XrayError) as exc:
+            self._upload_failed(exc, self._pending)
+            return
+        except Exception as exc:
+            # e.g. an unexpected response, the results were not spooled and are sent again with the next upload
+            _logger.exception('Could not upload %d test result(s), retrying with the next upload', len(self._pending))
+            self.exception = exc
+            return
+        else:
+            self.exception = None
+        self._pending = []
+
+    def _upload_failed(self, exc: Exception, tests: List[bytes]) -> None:
+        if self.publisher.outbox is None:
+            _logger.warning('Could not upload %d test result(s), retrying with the next upload', len(tests))
+            self.exception = exc
+            self._pending = list(tests)
+            return
+        # the publisher spooled what it could not upload, it must not be sent twice
+        _logger.warning('Could not upload %d test result(s), spooled to %s', len(tests),
+                        self.publisher.outbox.directory)
+        self.spool_errors.append(exc)
+        self._pending = []
+
+    def _run(self) -> None:
+        try:
+            self._upload()
+        except Exception as exc:
+            _logger.exception('Background upload of test results stopped')
+            self.exception = exc
+
+    def _upload(self) -> None:
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(last_flush + self.flush_interval - time.monotonic(), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(final=True)
+                return
+            if item is not None:
+                self._add(item)
+            if len(self._pending) >= self.flush_count or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def _add(self, item: Union[dict, bytes]) -> None:
+        if isinstance(item, bytes):
+            self._pending.append(item)
+            return
+        # results not encoded by the caller are encoded here, off the test thread
+        try:
+            self._pending.append(self.publisher.serializer.dumps(item))
+        except Exception as exc:
+            _logger.exception('Could not encode test result %s', item.get('testKey', ''))
+            self.lost += 1
+            self.lost_exception = exc
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from _pytest._io import TerminalWriter
+
+from .constants import MAX_COMMENT_LENGTH
+
+TRUNCATION_MODES = ('head', 'tail', 'both')
+TB_STYLES = ('auto', 'long', 'short', 'line', 'native')
+
+# Replaces the text left out of a truncated comment
+TRUNCATION_MARKER = '\n[...]\n'
+
+
+def _utf8(text: str) -> bytes:
+    # surrogatepass keeps lone surrogates, e.g. of undecodable file names, countable and reversible
+    return text.encode('utf-8', 'surrogatepass')
+
+
+def utf8_size(text: str) -> int:
+    """Return the size of text in bytes, UTF-8 encoded."""
+    return len(text) if text.isascii() else len(_utf8(text))
+
+
+def _head(text: str, size: int) -> str:
+    """Return the longest beginning of text of at most size bytes that ends at a character boundary."""
+    if text.isascii():
+        end = min(size, len(text))
+    else:
+        encoded = _utf8(text)
+        if len(encoded) <= size:
+            return text
+        while size and encoded[size] & 0xC0 == 0x80:
+            # a UTF-8 continuation byte, the character it belongs to does not fit
+            size -= 1
+        end = len(encoded[:size].decode('utf-8', 'surrogatepass'))
+    # a cut within the marker of an earlier truncation, e.g. of a joined comment, moves to the start of the marker
+    marker = text.find(TRUNCATION_MARKER, max(end - len(TRUNCATION_MARKER) + 1, 0), end + len(TRUNCATION_MARKER) - 1)
+    return text[:marker if marker != -1 else end]
+
+
+def _tail(text: str, size: int) -> str:
+    """Return the longest end of text of at most size bytes that starts at a character boundary."""
+    if size <= 0:
+        return ''
+    if text.isascii():
+        start = max(len(text) - size, 0)
+    else:
+        encoded = _utf8(text)
+        if len(encoded) <= size:
+            return text
+        cut = len(encoded) - size
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut += 1
+        start = len(text) - len(encoded[cut:].decode('utf-8', 'surrogatepass'))
+    # a cut within the marker of an earlier truncation moves to the end of the marker
+    marker = text.find(TRUNCATION_MARKER, max(start - len(TRUNCATION_MARKER) + 1, 0),
+                       start + len(TRUNCATION_MARKER) - 1)
+    return text[marker + len(TRUNCATION_MARKER) if marker != -1 else start:]
+
+
+class _HeadFull(Exception):
+    """Raised by a head-only _BoundedWriter once it is full, to stop rendering early."""
+
+
+class _BoundedWriter:
+    """File-like sink keeping only the first head and the last tail bytes, UTF-8 encoded, of the text written to it."""
+
+    def __init__(self, head: int, tail: int):
+        self.head = head
+        self.tail = tail
+        self._head_parts: list[str] = []
+        self._head_size = 0
+        self._tail_parts: list[str] = []
+        self._tail_size = 0
+        self.truncated = False
+
+    def write(self, text: str) -> int:
+        written = len(text)
+        if self._head_size < self.head:
+            part = _head(text, self.head - self._head_size)
+            self._head_parts.append(part)
+            self._head_size += utf8_size(part)
+            text = text[len(part):]
+            if text:
+                # the next character does not fit, the head is complete even if it is a few bytes short
+                self._head_size = self.head
+        if not text:
+            return written
+        if not self.tail:
+            self.truncated = True
+            raise _HeadFull
+        self._tail_parts.append(text)
+        self._tail_size += utf8_size(text)
+        if self._tail_size > 2 * self.tail:
+            # trim in batches, so the kept tail is joined once per tail bytes written
+            tail = _tail(''.join(self._tail_parts), self.tail)
+            self._tail_parts = [tail]
+            self._tail_size = utf8_size(tail)
+            self.truncated = True
+        return written
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self, strip: bool = False) -> str:
+        tail = ''.join(self._tail_parts)
+        if self._tail_size > self.tail:
+            tail = _tail(tail, self.tail)
+            self.truncated = True
+        head = ''.join(self._head_parts)
+        if not self.truncated:
+            return (head + tail).strip() if strip else head + tail
+        if strip:
+            head, tail = head.lstrip(), tail.rstrip()
+        return head + TRUNCATION_MARKER + tail
+
+
+@dataclass(frozen=True)
+class CommentPolicy:
+    """
+    How the failure text of a test is captured for the Xray comment.
+
+    At most max_length bytes, UTF-8 encoded, are kept per test, as Jira limits its text fields in bytes.
+    Longer texts keep their beginning ('head'), their end ('tail') or both ('both'), cut at a character
+    boundary, the left out part is replaced by TRUNCATION_MARKER.
+    With a tb_style the failure is rendered in that traceback style instead of the one given by --tb.
+    """
+    max_length: int = MAX_COMMENT_LENGTH
+    truncation: str = 'head'
+    tb_style: Optional[str] = None
+
+    def __post_init__(self):
+        if self.max_length < len(TRUNCATION_MARKER):
+            raise ValueError(f'Maximum comment length must be at least {len(TRUNCATION_MARKER)} bytes')
+        if self.truncation not in TRUNCATION_MODES:
+            raise ValueError(f'Comment truncation must be one of {", ".join(TRUNCATION_MODES)}')
+        if self.tb_style is not None and self.tb_style not in TB_STYLES:
+            raise ValueError(f'Traceback style must be one of {", ".join(TB_STYLES)}')
+
+    def _writer(self) -> _BoundedWriter:
+        budget = max(self.max_length - len(TRUNCATION_MARKER), 0)
+        if self.truncation == 'head':
+            return _BoundedWriter(budget, 0)
+        if self.truncation == 'tail':
+            return _BoundedWriter(0, budget)
+        return _BoundedWriter(budget - budget // 2, budget // 2)
+
+    def render(self, longrepr: Any) -> str:
+        """
+        Render a report or failure representation without holding more than the kept text in memory.
+
+        :param longrepr: anything with a toterminal method, e.g. a TestReport or an ExceptionRepr
+        """
+        writer = self._writer()
+        terminal_writer = TerminalWriter(file=writer)
+        terminal_writer.hasmarkup = False
+        try:
+            longrepr.toterminal(terminal_writer)
+        except _HeadFull:
+            pass
+        return writer.getvalue(strip=True)
+
+    def truncate(self, text: str) -> str:
+        if utf8_size(text) <= self.max_length:
+            return text
+        writer = self._writer()
+        try:
+            writer.write(text)
+        except _HeadFull:
+            pass
+        return writer.getvalue()
+
+    def is_full(self, text: str) -> bool:
+        """Return whether nothing of a text appended to text, as kept by this policy, would be kept."""
+        return self.truncation == 'head' and (text.endswith(TRUNCATION_MARKER) or utf8_size(text) >= self.max_length)
+
+
+DEFAULT_COMMENT_POLICY = CommentPolicy()
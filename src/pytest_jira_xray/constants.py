@@ -1,3 +1,24 @@
 AUTHENTICATE_ENDPOINT = '/api/v2/authenticate'
+DC_ENDPOINT = '/rest/raven/2.0/import/execution'
+CLOUD_ENDPOINT = '/api/v2/import/execution'
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
 
+MAX_COMMENT_LENGTH = 32 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+# (connect, read) timeout in seconds, imports of large executions can take a while to be processed
+DEFAULT_TIMEOUT = (10, 300)
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+# Xray tokens are valid for 24 hours, tokens are refreshed this many seconds before they expire
+DEFAULT_TOKEN_LIFETIME = 24 * 60 * 60
+TOKEN_EXPIRY_MARGIN = 60
+# Number of tests uploaded per import request, 0 uploads all tests in a single request
+DEFAULT_CHUNK_SIZE = 0
+# Number of chunks uploaded at the same time, 1 uploads the chunks one after another
+DEFAULT_UPLOAD_WORKERS = 1
+# Background uploads are sent when this many results are waiting or this many seconds have passed
+DEFAULT_FLUSH_COUNT = 1000
+DEFAULT_FLUSH_INTERVAL = 60.0
+# Evidence above these sizes in bytes, per test and per test run, is not attached
+DEFAULT_EVIDENCE_MAX_TEST_SIZE = 10 * 1024 * 1024
+DEFAULT_EVIDENCE_MAX_RUN_SIZE = 100 * 1024 * 1024
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+import shutil
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import pytest
+
+from .constants import DEFAULT_EVIDENCE_MAX_RUN_SIZE, DEFAULT_EVIDENCE_MAX_TEST_SIZE
+
+# Multiple of 3, so the Base64 encoded chunks can be concatenated without padding in between
+_READ_SIZE = 3 * 64 * 1024
+
+
+class SpooledEvidence:
+    """Base64 encoded evidence data kept in a spool file until the report is written or uploaded."""
+    __slots__ = ('path',)
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> str:
+        return Path(self.path).read_text(encoding='ascii')
+
+    def __repr__(self) -> str:
+        return f'SpooledEvidence({self.path!r})'
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, SpooledEvidence):
+            return NotImplemented
+        return self.path == other.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+
+def json_default(obj: Any) -> Any:
+    """Serialize spooled evidence as its Base64 data, for the default argument of json.dump."""
+    if isinstance(obj, SpooledEvidence):
+        return obj.read()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class EvidenceSpool:
+    """
+    Base64 encode evidence files into a spool directory as they are recorded.
+
+    Each distinct content is encoded and stored once, in a file named after its SHA-256 hash, and
+    referenced by all tests it is attached to. Evidence above the per-test or per-run size budget,
+    counted in bytes before encoding, is dropped with a warning.
+    A temporary spool directory is created on first use and removed by close.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_test_size: Optional[int] = DEFAULT_EVIDENCE_MAX_TEST_SIZE,
+        max_run_size: Optional[int] = DEFAULT_EVIDENCE_MAX_RUN_SIZE
+    ) -> None:
+        self._directory: Optional[Path] = Path(directory) if directory else None
+        self._owns_directory = False
+        self.max_test_size = max_test_size
+        self.max_run_size = max_run_size
+        self.run_size = 0
+        self._test_sizes: dict[str, int] = dict()
+        self._evidence: dict[str, list] = dict()
+        self._digests: dict[tuple, str] = dict()
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix='xray-evidence-'))
+            self._owns_directory = True
+        return self._directory
+
+    def add(
+        self,
+        nodeid: str,
+        source: Union[str, os.PathLike, bytes],
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> bool:
+        """
+        Spool a single piece of evidence for a test.
+
+        :param nodeid: node id of the test the evidence belongs to
+        :param source: path of the evidence file, or its content
+        :param filename: file name shown in Xray, by default the name of the source file
+        :param content_type: MIME type, by default guessed from the file name
+        :return: whether the evidence was recorded
+        """
+        if isinstance(source, bytes):
+            if not filename:
+                raise ValueError('A file name is required for evidence given as bytes')
+            size = len(source)
+        else:
+            filename = filename or os.path.basename(source)
+            size = os.stat(source).st_size
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        test_size = self._test_sizes.get(nodeid, 0) + size
+        if self.max_test_size is not None and test_size > self.max_test_size:
+            warnings.warn(pytest.PytestWarning(
+                f'Evidence {filename} exceeds the size budget of {self.max_test_size} bytes per test, not recorded'))
+            return False
+
+        digest = self._digest(source)
+        path = self.directory / f'{digest}.b64'
+        if not path.exists():
+            # only content that is not spooled yet is encoded and counts towards the run budget
+            if self.max_run_size is not None and self.run_size + size > self.max_run_size:
+                warnings.warn(pytest.PytestWarning(
+                    f'Evidence {filename} exceeds the size budget of {self.max_run_size} bytes per run, not recorded'))
+                return False
+            self._encode(source, path)
+            self.run_size += size
+        self._test_sizes[nodeid] = test_size
+        self._evidence.setdefault(nodeid, []).append((str(path), filename, content_type))
+        return True
+
+    def _digest(self, source: Union[str, os.PathLike, bytes]) -> str:
+        if isinstance(source, bytes):
+            return hashlib.sha256(source).hexdigest()
+        stat = os.stat(source)
+        # the same unchanged file is often attached to many tests, it is hashed only once
+        cache_key = (os.path.realpath(source), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(cache_key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(source, 'rb') as source_file:
+                while chunk := source_file.read(_READ_SIZE):
+                    hasher.update(chunk)
+            digest = self._digests[cache_key] = hasher.hexdigest()
+        return digest
+
+    def _encode(self, source: Union[str, os.PathLike, bytes], path: Path) -> None:
+        """Encode the source into a temporary file next to the spool file and move it into place."""
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with open(fd, 'wb') as spool_file, \
+                    (io.BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')) as source_file:
+                while chunk := source_file.read(_READ_SIZE):
+                    spool_file.write(base64.b64encode(chunk))
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def pop(self, nodeid: str) -> list:
+        """Return the (path, filename, content type) of all evidence recorded for a test and forget them."""
+        self._test_sizes.pop(nodeid, None)
+        return self._evidence.pop(nodeid, [])
+
+    def close(self) -> None:
+        if self._owns_directory:
+            shutil.rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,14 @@
+from typing import List
+
+
+class XrayError(Exception):
+    """Raised when the Xray report cannot be created or published"""
+
+
+class XrayChunkError(XrayError):
+    """Raised when the test execution was created or updated, but some chunks of its results could not be uploaded"""
+
+    def __init__(self, message: str, key: str, failed_tests: List[bytes]) -> None:
+        super().__init__(message)
+        self.key = key
+        self.failed_tests = failed_tests
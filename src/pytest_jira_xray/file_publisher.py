@@ -1,12 +1,52 @@
-import json
+import bz2
+import gzip
+import lzma
 import os
+import uuid
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Callable, Iterable, Optional, Tuple, Union
+
+from .constants import WRITE_BUFFER_SIZE
+from .serializer import JsonSerializer, iter_report
+
+_TEMP_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+
+
+def _create_temp_file(path: Path) -> Tuple[int, Path]:
+    """
+    Create a new hidden temporary file next to path.
+
+    Unlike tempfile.mkstemp, which creates files readable by the owner only, the file gets the usual
+    permissions of a new file as limited by the umask of the process.
+    """
+    while True:
+        temp_path = path.parent / f'.{path.name}.{uuid.uuid4().hex[:8]}.tmp'
+        try:
+            return os.open(temp_path, _TEMP_FLAGS, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def _zstd_writer(raw: BinaryIO) -> BinaryIO:
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImportError("Writing a .zst report requires the 'zstandard' package") from exc
+    return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+
+
+# Maps the report file suffix to a function wrapping the raw file in a compressing writer
+_COMPRESSORS: dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    '.gz': lambda raw: gzip.GzipFile(fileobj=raw, mode='wb'),
+    '.bz2': lambda raw: bz2.BZ2File(raw, mode='wb'),
+    '.xz': lambda raw: lzma.LZMAFile(raw, mode='wb'),
+    '.zst': _zstd_writer,
+}
 
 
 class FilePublisher:
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, compact: bool = False, serializer: Optional[JsonSerializer] = None):
         if filepath is None:
             return
         if os.path.split(filepath)[1] == '':
@@ -14,9 +54,46 @@ class FilePublisher:
 
         self._terminal_summary = []
         self.publish = self._publish
+        self.publish_encoded = self._publish_encoded
+        self.stream_start = self._stream_start
+        self.stream_test = self._stream_test
+        self.stream_finish = self._stream_finish
+        self.stream_abort = self._stream_abort
         self._filepath: Path = Path(filepath).absolute().resolve()
+        self._compressor = _COMPRESSORS.get(self._filepath.suffix.lower())
+        self._compact = compact
+        self._serializer = serializer or JsonSerializer()
+        self._raw: Optional[BinaryIO] = None
+        self._temp_path: Optional[Path] = None
+        self._stream: Optional[BinaryIO] = None
+        self._streamed_tests = 0
         self._terminal_summary.append(f"Report File path is {self._filepath}")
 
+    def _dumps(self, data: Union[dict, list, str], indent: int = 0) -> bytes:
+        encoded = self._serializer.dumps(data, indent=not self._compact)
+        return encoded.replace(b'\n', b'\n' + b' ' * indent) if indent else encoded
+
+    def _open(self) -> BinaryIO:
+        """Open a buffered, optionally compressing, binary stream to a temporary file next to the report file."""
+        self._filepath.parents[0].mkdir(parents=True, exist_ok=True)
+        fd, self._temp_path = _create_temp_file(self._filepath)
+        self._raw = open(fd, 'wb', buffering=WRITE_BUFFER_SIZE)
+        return self._compressor(self._raw) if self._compressor else self._raw
+
+    def _close(self, report_file: BinaryIO, commit: bool) -> None:
+        """Close the temporary file and move it over the report file, or remove it if the write did not succeed."""
+        try:
+            if report_file is not self._raw:
+                report_file.close()
+            self._raw.close()
+            if commit:
+                os.replace(self._temp_path, self._filepath)
+        finally:
+            if self._temp_path.exists():
+                self._temp_path.unlink()
+            self._raw = None
+            self._temp_path = None
+
     def _publish(self, report_data: Union[dict, list]):
         """
         Save results to a file or raise XrayError.
@@ -25,10 +102,104 @@ class FilePublisher:
         """
         if not isinstance(report_data, (list, dict)):
             raise TypeError("Trying to write report of incorrect type")
-        self._filepath.parents[0].mkdir(parents=True, exist_ok=True)
-        with open(self._filepath, 'w') as report_file:
-            json.dump(report_data, report_file, indent=2)
-            self._terminal_summary.append(f"Report has been successfully written to {self._filepath}")
+        self._write((self._dumps(report_data),))
+
+    def _publish_encoded(self, report_data: dict, tests: Iterable[bytes]):
+        """
+        Save results whose tests are encoded by the serializer of the report to a compact report file.
+
+        The header and each test result are written to the file as they come, the report is never held in memory.
+
+        :param report_data: test report data without the tests
+        :param tests: test results encoded compact by the same serializer, e.g. as they are encoded
+        """
+        if not isinstance(report_data, dict):
+            raise TypeError("Trying to write report of incorrect type")
+        if not self._compact:
+            raise ValueError("Encoded test results can only be written to a compact report")
+        self._write(iter_report(self._dumps(report_data), tests))
+
+    def _write(self, parts: Iterable[bytes]):
+        report_file = self._open()
+        try:
+            for part in parts:
+                report_file.write(part)
+        except BaseException:
+            self._close(report_file, commit=False)
+            raise
+        self._close(report_file, commit=True)
+        self._terminal_summary.append(f"Report has been successfully written to {self._filepath}")
+
+    def _stream_start(self):
+        """Open the report file and start the tests array, so test results can be written as they finish."""
+        self._stream = self._open()
+        self._stream.write(b'{"tests":[' if self._compact else b'{\n  "tests": [')
+        self._streamed_tests = 0
+
+    def _stream_test(self, test_data: Union[dict, bytes]):
+        """
+        Append a single test result to the tests array of the report file.
+
+        :param test_data: Xray test data to be written, or with a compact report its encoding by the same serializer
+        """
+        if isinstance(test_data, bytes) and not self._compact:
+            raise ValueError("Encoded test results can only be written to a compact report")
+        if not isinstance(test_data, (dict, bytes)):
+            raise TypeError("Trying to write test of incorrect type")
+        encoded = test_data if isinstance(test_data, bytes) else self._dumps(test_data, indent=4)
+        if self._streamed_tests:
+            self._stream.write(b',')
+        if not self._compact:
+            self._stream.write(b'\n    ')
+        self._stream.write(encoded)
+        self._streamed_tests += 1
+
+    def _stream_finish(self, report_data: dict):
+        """
+        Close the tests array, write the remaining report fields and move the report file into place.
+
+        :param report_data: report data without the tests array
+        """
+        if not isinstance(report_data, dict):
+            raise TypeError("Trying to write report of incorrect type")
+        stream, self._stream = self._stream, None
+        try:
+            if self._compact:
+                stream.write(b']')
+            else:
+                stream.write(b'\n  ]' if self._streamed_tests else b']')
+            for key, value in report_data.items():
+                if self._compact:
+                    stream.write(b',' + self._dumps(key) + b':' + self._dumps(value))
+                else:
+                    stream.write(b',\n  ' + self._dumps(key) + b': ' + self._dumps(value, indent=2))
+            stream.write(b'}' if self._compact else b'\n}\n')
+        except BaseException:
+            self._close(stream, commit=False)
+            raise
+        self._close(stream, commit=True)
+        self._terminal_summary.append(f"Report has been successfully written to {self._filepath}")
+
+    def _stream_abort(self):
+        """Remove the partially written report file of a stream that was not finished, e.g. after an error."""
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            self._close(stream, commit=False)
 
     def publish(self, report_data: Union[list, dict]):
         pass  # Do nothing function in case no report file was requested
+
+    def publish_encoded(self, report_data: dict, tests: Iterable[bytes]):
+        pass
+
+    def stream_start(self):
+        pass
+
+    def stream_test(self, test_data: Union[dict, bytes]):
+        pass
+
+    def stream_finish(self, report_data: dict):
+        pass
+
+    def stream_abort(self):
+        pass
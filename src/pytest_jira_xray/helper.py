@@ -1,12 +1,20 @@
+import functools
 import os
+from datetime import datetime
 from os import environ
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 import re
 
-from pytest_jira_xray.exceptions import XrayError
+from _pytest.nodes import Item
+from _pytest.stash import StashKey
 
-from src.pytest_jira_xray.xray_statuses import Status, STATUS_HIERARCHY
+from pytest_jira_xray.constants import DATETIME_FORMAT
+from pytest_jira_xray.exceptions import XrayError
+from pytest_jira_xray.xray_statuses import STATUS_HIERARCHY, STATUS_RANK, Status, merge_statuses
 
+test_keys_key = StashKey[List[str]]()
+parameters_key = StashKey[Dict[str, str]]()
+callspec_id_key = StashKey[str]()
 
 # This is the hierarchy of the Status, from bottom to top.
 # When merging two statuses, the highest will be picked.
@@ -19,15 +27,7 @@ from src.pytest_jira_xray.xray_statuses import Status, STATUS_HIERARCHY
 # On-site jira uses the enum strings directly
 
 
-def get_base_options() -> Dict[str, Any]:
-    options = {}
-    try:
-        base_url = environ['XRAY_API_BASE_URL']
-    except KeyError as e:
-        raise XrayError(
-            'pytest-jira-xray plugin requires environment variable: XRAY_API_BASE_URL'
-        ) from e
-
+def get_verify_ssl() -> Union[bool, str]:
     verify = os.environ.get('XRAY_API_VERIFY_SSL', 'True')
 
     if verify.upper() == 'TRUE':
@@ -37,8 +37,19 @@ def get_base_options() -> Dict[str, Any]:
     else:
         if not os.path.exists(verify):
             raise XrayError(f'Cannot find certificate file "{verify}"')
+    return verify
+
+
+def get_base_options() -> Dict[str, Any]:
+    options = {}
+    try:
+        base_url = environ['XRAY_API_BASE_URL']
+    except KeyError as e:
+        raise XrayError(
+            'pytest-jira-xray plugin requires environment variable: XRAY_API_BASE_URL'
+        ) from e
 
-    options['VERIFY'] = verify
+    options['VERIFY'] = get_verify_ssl()
     options['BASE_URL'] = base_url
     return options
 
@@ -101,6 +112,64 @@ def get_api_token_auth() -> Dict[str, Any]:
     return options
 
 
+def get_test_keys(item: Item) -> List[str]:
+    """Return the Xray test keys of all xray markers of a test item, looked up once per item."""
+    test_keys = item.stash.get(test_keys_key, None)
+    if test_keys is None:
+        test_keys = item.stash[test_keys_key] = [
+            test_key for marker in item.iter_markers(name='xray') for test_key in marker.args
+        ]
+    return test_keys
+
+
+def get_parameters(item: Item) -> Dict[str, str]:
+    """Return the parameters of a parametrized test case as strings, looked up once per item."""
+    parameters = item.stash.get(parameters_key, None)
+    if parameters is None:
+        callspec = getattr(item, 'callspec', None)
+        parameters = item.stash[parameters_key] = {
+            name: str(value) for name, value in callspec.params.items()
+        } if callspec else {}
+    return parameters
+
+
+def get_callspec_id(item: Item) -> str:
+    """Return the id of a parametrized test case, e.g. 1-a for test_a[1-a], or '' for other tests."""
+    callspec_id = item.stash.get(callspec_id_key, None)
+    if callspec_id is None:
+        callspec = getattr(item, 'callspec', None)
+        callspec_id = item.stash[callspec_id_key] = callspec.id if callspec else ''
+    return callspec_id
+
+
+def strip_callspec_id(nodeid: str, callspec_id: str) -> str:
+    """Return the node id shared by all cases of a parametrized test, the node id of the case otherwise."""
+    suffix = f'[{callspec_id}]'
+    return nodeid[:-len(suffix)] if callspec_id and nodeid.endswith(suffix) else nodeid
+
+
+def collect_metadata(item: Item) -> None:
+    """Look up the Xray test keys and parameters of a test item and keep them in its stash."""
+    get_test_keys(item)
+    get_parameters(item)
+    get_callspec_id(item)
+
+
+@functools.lru_cache(maxsize=1024)
+def _format_second(second: int) -> str:
+    return datetime.fromtimestamp(second).astimezone().strftime(DATETIME_FORMAT)
+
+
+def format_timestamp(timestamp: float) -> str:
+    """
+    Format a time.time() timestamp with DATETIME_FORMAT in the local timezone.
+
+    DATETIME_FORMAT has a resolution of one second, the text of each second is built once and cached,
+    so the many tests finishing within the same second share it.
+    """
+    return _format_second(int(timestamp))
+
+
 def _from_environ_or_none(name: str) -> Optional[str]:
     if name in environ:
         val = environ[name].strip()
@@ -131,9 +200,8 @@ def _from_environ(name: str, separator: str = None) -> List[str]:
 
 
 def _merge_status(status_1: Status, status_2: Status):
-    """Merges the status of two tests. """
-
-    return STATUS_HIERARCHY[max(
-        STATUS_HIERARCHY.index(status_1),
-        STATUS_HIERARCHY.index(status_2)
-    )]
+    """Merges the status of two tests, see merge_statuses. """
+    try:
+        return STATUS_HIERARCHY[max(STATUS_RANK[status_1], STATUS_RANK[status_2])]
+    except KeyError:
+        return merge_statuses((status_1, status_2))
@@ -41,3 +41,14 @@ def pytest_xray_test_environments(report):
 @pytest.hookspec(firstresult=True)
 def pytest_xray_status_mapping(report_outcome, failure_when, wasxfail):
     """Called before setting the test status, can be used to set custom statuses"""
+
+
+def pytest_xray_publishers(config):
+    """
+    Called at the start of the session to add publishers of the Xray report.
+
+    A publisher is an object with a publish_payload(payload) method, at the end of the session it is called with
+    the XrayPayload shared by all publishers.
+
+    :return: a single publisher, or an iterable of publishers, e.g. a list
+    """
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Union
+
+from .evidence import json_default
+from .exceptions import XrayChunkError, XrayError
+from .serializer import iter_report
+
+if TYPE_CHECKING:
+    from .xray_publisher import XrayPublisher
+
+
+class XrayOutbox:
+    """
+    Directory of import requests that could not be uploaded to the Xray server.
+
+    Each file holds the complete body of one import request, evidence included, so the results
+    survive the test run and can be uploaded later with --xray-replay, in the order they were spooled.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike]) -> None:
+        self.directory = Path(directory)
+
+    def put(self, data: Union[dict, bytes, Iterable[bytes]]) -> Path:
+        """
+        Spool the body of an import request and return the path of its file.
+
+        :param data: the request data, its encoding, or the parts of its encoding, e.g. from iter_report
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json'
+        self._write(path, data)
+        return path
+
+    def _write(self, path: Path, data: Union[dict, bytes, Iterable[bytes]]) -> None:
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with open(fd, 'wb') as spool_file:
+                if isinstance(data, bytes):
+                    spool_file.write(data)
+                elif isinstance(data, dict):
+                    spool_file.write(json.dumps(data, default=json_default).encode('utf-8'))
+                else:
+                    spool_file.writelines(data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def paths(self) -> List[Path]:
+        """Return the spooled import requests, oldest first."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob('*.json'))
+
+    def __len__(self) -> int:
+        return len(self.paths())
+
+    def replay(self, publisher: 'XrayPublisher') -> Dict[str, Union[str, Exception]]:
+        """
+        Upload all spooled import requests, oldest first, and remove the uploaded ones.
+
+        A request that fails again is kept under its name, so it keeps its place in the spool order.
+        When only some chunks of it failed, the file is rewritten with the test results of those chunks.
+
+        :return: the test execution key, or the error, by file name
+        """
+        results: Dict[str, Union[str, Exception]] = {}
+        # the requests are kept here, the publisher must not spool their failures again
+        outbox, publisher.outbox = publisher.outbox, None
+        try:
+            for path in self.paths():
+                data = json.loads(path.read_bytes())
+                try:
+                    results[path.name] = publisher.publish(data)
+                except XrayChunkError as exc:
+                    results[path.name] = exc
+                    header = publisher.serializer.dumps({'testExecutionKey': exc.key})
+                    self._write(path, iter_report(header, exc.failed_tests))
+                    continue
+                except (ValueError, XrayError) as exc:
+                    results[path.name] = exc
+                    continue
+                path.unlink()
+        finally:
+            publisher.outbox = outbox
+        return results
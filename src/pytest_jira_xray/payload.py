@@ -0,0 +1,33 @@
+from typing import Callable, Iterator, List
+
+from .serializer import JsonSerializer, join_report
+
+
+class XrayPayload:
+    """
+    Xray report of a test session, built once and handed to every publisher.
+
+    The test results are encoded by the shared serializer only while a publisher writes or sends them,
+    so the encoded report, evidence included, is never kept in memory for the whole session.
+    """
+
+    def __init__(self, header: dict, tests: List[dict], serializer: JsonSerializer) -> None:
+        self.header = header
+        self.tests = tests
+        self.serializer = serializer
+
+    def encoded_tests(self) -> Iterator[bytes]:
+        """Yield the test results encoded compact, one JSON object each."""
+        for test in self.tests:
+            yield self.serializer.dumps(test)
+
+    def encode(self) -> bytes:
+        """Return the compact JSON report, built anew by every call."""
+        return join_report(self.serializer.dumps(self.header), self.encoded_tests())
+
+    def to_json(self) -> dict:
+        return {**self.header, 'tests': self.tests}
+
+    def select(self, keep: Callable[[dict], bool]) -> 'XrayPayload':
+        """Return a payload with the same header and the test results kept."""
+        return XrayPayload(self.header, [test for test in self.tests if keep(test)], self.serializer)
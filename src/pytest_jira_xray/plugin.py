@@ -13,34 +13,74 @@
 # limitations under the License.
 
 from argparse import Action
+import functools
+import os
+from typing import Callable, Optional, Union
 import urllib.parse
 
 import pytest
 
 from _pytest.config import Config
 from _pytest.config.argparsing import Parser
+from _pytest.fixtures import FixtureRequest
 from _pytest.stash import StashKey
 
+from pytest_jira_xray.comment_policy import TB_STYLES, TRUNCATION_MODES, CommentPolicy
+from pytest_jira_xray.constants import (  # noqa: F401
+    CLOUD_ENDPOINT,
+    DC_ENDPOINT,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_EVIDENCE_MAX_RUN_SIZE,
+    DEFAULT_EVIDENCE_MAX_TEST_SIZE,
+    DEFAULT_FLUSH_COUNT,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_UPLOAD_WORKERS,
+    MAX_COMMENT_LENGTH,
+)
+from pytest_jira_xray.evidence import EvidenceSpool
+from pytest_jira_xray.outbox import XrayOutbox
+from pytest_jira_xray.xray_metadata import XrayMetadata
+from pytest_jira_xray.xray_replay import XrayReplay
 from pytest_jira_xray.xray_report import XrayReport
+from pytest_jira_xray.xray_worker import XrayWorker
+from pytest_jira_xray.xray_statuses import Status
 
 XRAY_EXECUTION_KEY = '--execution'
 XRAY_JSON = ['--xrayjson', '--xray-json']
+XRAY_STREAM = ['--xraystream', '--xray-stream']
+XRAY_COMPACT = ['--xraycompact', '--xray-compact']
 XRAY_TEST_PLAN_KEY = ['--testplan', '--test-plan']
 JIRA_API_KEY = ['--apikey', '--api-key']
 JIRA_TOKEN = '--token'
 JIRA_BASIC_AUTH = ['--basicauth', '--basic-auth']
 JIRA_SERVER = ['--jiraurl', '--jira-url']
 JIRA_CLOUD = '--cloud'
+JIRA_CHUNK_SIZE = ['--xraychunksize', '--xray-chunk-size']
+JIRA_CHUNK_BYTES = ['--xraychunkbytes', '--xray-chunk-bytes']
+JIRA_UPLOAD_WORKERS = ['--xrayuploadworkers', '--xray-upload-workers']
+JIRA_BACKGROUND = ['--xraybackground', '--xray-background']
+JIRA_FLUSH_COUNT = ['--xrayflushcount', '--xray-flush-count']
+JIRA_FLUSH_INTERVAL = ['--xrayflushinterval', '--xray-flush-interval']
+XRAY_MAX_COMMENT_LENGTH = ['--xraymaxcommentlength', '--xray-max-comment-length']
+XRAY_COMMENT_TRUNCATION = ['--xraycommenttruncation', '--xray-comment-truncation']
+XRAY_TB_STYLE = ['--xraytb', '--xray-tb']
+XRAY_EVIDENCE_DIR = ['--xrayevidencedir', '--xray-evidence-dir']
+XRAY_EVIDENCE_MAX_TEST_SIZE = ['--xrayevidencemaxtestsize', '--xray-evidence-max-test-size']
+XRAY_EVIDENCE_MAX_SIZE = ['--xrayevidencemaxsize', '--xray-evidence-max-size']
+XRAY_OUTBOX = ['--xrayoutbox', '--xray-outbox']
+XRAY_REPLAY = ['--xrayreplay', '--xray-replay']
+XRAY_INCREMENTAL = ['--xrayincremental', '--xray-incremental']
+XRAY_RERUN_ITERATIONS = ['--xrayreruniterations', '--xray-rerun-iterations']
 ENV_TEST_EXECUTION_TEST_ENVIRONMENTS = 'XRAY_EXECUTION_TEST_ENVIRONMENTS'
 ENV_TEST_EXECUTION_FIX_VERSION = 'XRAY_EXECUTION_FIX_VERSION'
 ENV_TEST_EXECUTION_REVISION = 'XRAY_EXECUTION_REVISION'
 ENV_TEST_EXECUTION_SUMMARY = 'XRAY_EXECUTION_SUMMARY'
 ENV_TEST_EXECUTION_DESC = 'XRAY_EXECUTION_DESC'
 ENV_NAME = 'XRAY_API_BASE_URL'
-DC_ENDPOINT = '/rest/raven/2.0/import/execution'
-CLOUD_ENDPOINT = '/api/v2/import/execution'
 
 xray_key = StashKey['XrayReport']()
+comment_policy_key = StashKey[CommentPolicy]()
+evidence_spool_key = StashKey[EvidenceSpool]()
 requirement_key = StashKey[list[str]]()
 description_key = StashKey[str]()
 
@@ -74,6 +114,19 @@ def pytest_addoption(parser: Parser) -> None:
         default=None,
         help='Create a JSON report file at the given path',
     )
+    xray.addoption(
+        *XRAY_STREAM,
+        action='store_true',
+        default=False,
+        help='Write each test result to the JSON report file as soon as the test finishes',
+    )
+    xray.addoption(
+        *XRAY_COMPACT,
+        action='store_true',
+        default=False,
+        help='Write the JSON report file without indentation. The file is compressed when the path ends with '
+             '.gz, .bz2, .xz or .zst',
+    )
     xray.addoption(
         *JIRA_SERVER,
         action=_URLOrBool,
@@ -108,6 +161,126 @@ def pytest_addoption(parser: Parser) -> None:
         help='Use a username and password encoded in the USERNAME:PASSWORD > Base64 format specified by Jira OAuth '
              '1.0 documentation',
     )
+    xray.addoption(
+        *JIRA_CHUNK_SIZE,
+        metavar='TESTS',
+        action='store',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Upload at most this many test results per import request, 0 uploads all results at once '
+             f'(default: {DEFAULT_CHUNK_SIZE})',
+    )
+    xray.addoption(
+        *JIRA_CHUNK_BYTES,
+        metavar='BYTES',
+        action='store',
+        type=int,
+        default=None,
+        help='Also limit the size of the test results uploaded per import request',
+    )
+    xray.addoption(
+        *JIRA_UPLOAD_WORKERS,
+        metavar='WORKERS',
+        action='store',
+        type=int,
+        default=DEFAULT_UPLOAD_WORKERS,
+        help=f'Number of chunks uploaded at the same time (default: {DEFAULT_UPLOAD_WORKERS})',
+    )
+    xray.addoption(
+        *JIRA_BACKGROUND,
+        action='store_true',
+        default=False,
+        help='Upload test results from a background thread while the tests are running',
+    )
+    xray.addoption(
+        *JIRA_FLUSH_COUNT,
+        metavar='TESTS',
+        action='store',
+        type=int,
+        default=DEFAULT_FLUSH_COUNT,
+        help=f'Upload in the background once this many test results are waiting (default: {DEFAULT_FLUSH_COUNT})',
+    )
+    xray.addoption(
+        *JIRA_FLUSH_INTERVAL,
+        metavar='SECONDS',
+        action='store',
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help=f'Upload in the background at least every this many seconds (default: {DEFAULT_FLUSH_INTERVAL:g})',
+    )
+    xray.addoption(
+        *XRAY_MAX_COMMENT_LENGTH,
+        metavar='BYTES',
+        action='store',
+        type=int,
+        default=MAX_COMMENT_LENGTH,
+        help=f'Maximum size of the failure text in the comment of a test, UTF-8 encoded '
+             f'(default: {MAX_COMMENT_LENGTH})',
+    )
+    xray.addoption(
+        *XRAY_COMMENT_TRUNCATION,
+        action='store',
+        choices=TRUNCATION_MODES,
+        default='head',
+        help='Keep the beginning, the end or both of a failure text that is too long (default: head)',
+    )
+    xray.addoption(
+        *XRAY_TB_STYLE,
+        metavar='STYLE',
+        action='store',
+        choices=TB_STYLES,
+        default=None,
+        help=f'Traceback style of the failure text, one of {", ".join(TB_STYLES)} (default: as --tb)',
+    )
+    xray.addoption(
+        *XRAY_EVIDENCE_DIR,
+        metavar='DIRECTORY',
+        action='store',
+        default=None,
+        help='Directory for the encoded evidence files (default: a temporary directory removed after the run)',
+    )
+    xray.addoption(
+        *XRAY_EVIDENCE_MAX_TEST_SIZE,
+        metavar='BYTES',
+        action='store',
+        type=int,
+        default=DEFAULT_EVIDENCE_MAX_TEST_SIZE,
+        help=f'Maximum size of the evidence of a single test (default: {DEFAULT_EVIDENCE_MAX_TEST_SIZE})',
+    )
+    xray.addoption(
+        *XRAY_EVIDENCE_MAX_SIZE,
+        metavar='BYTES',
+        action='store',
+        type=int,
+        default=DEFAULT_EVIDENCE_MAX_RUN_SIZE,
+        help=f'Maximum size of the evidence of the test run (default: {DEFAULT_EVIDENCE_MAX_RUN_SIZE})',
+    )
+    xray.addoption(
+        *XRAY_OUTBOX,
+        metavar='DIRECTORY',
+        action='store',
+        default=None,
+        help='Spool results that cannot be uploaded to the Jira server to this directory, see --xray-replay',
+    )
+    xray.addoption(
+        *XRAY_REPLAY,
+        metavar='DIRECTORY',
+        action='store',
+        default=None,
+        help='Upload the results spooled to this outbox directory to the Jira server instead of running tests',
+    )
+    xray.addoption(
+        *XRAY_INCREMENTAL,
+        action='store_true',
+        default=False,
+        help='Upload only the test results that changed since the last upload to the same test execution',
+    )
+    xray.addoption(
+        *XRAY_RERUN_ITERATIONS,
+        action='store_true',
+        default=False,
+        help='Report each attempt of a test rerun by pytest-rerunfailures as an iteration of its result',
+    )
 
 
 def pytest_configure(config: Config) -> None:
@@ -126,51 +299,121 @@ def pytest_configure(config: Config) -> None:
         'markers', 'test_description(DESCRIPTION): Give test a custom description'
     )
 
-    if (config.getoption(XRAY_JSON[0], None) is not None
-        or config.getoption(JIRA_SERVER[0], None) is not None) \
-            and not hasattr(config, 'workerinput'):
-        file_path = config.getoption(XRAY_JSON[1], None)
-        server_url = config.getoption(JIRA_SERVER[0], None)
-        execution_key = config.getoption(XRAY_EXECUTION_KEY, None)
-        test_plan_key = config.getoption(XRAY_TEST_PLAN_KEY[0], None)
-        api_key = config.getoption(JIRA_API_KEY[0], None)
-        token = config.getoption(JIRA_TOKEN, None)
-        basic_auth = config.getoption(JIRA_BASIC_AUTH[0], None)
-        cloud = config.getoption(JIRA_CLOUD, None)
-        config.stash[xray_key] = XrayReport(file_path, server_url, execution_key, test_plan_key, api_key, token,
-                                            basic_auth, cloud)
-        config.pluginmanager.register(plugin=config.stash[xray_key], name='pytest_jira_xray')
-
-
-@pytest.hookimpl(tryfirst=True, hookwrapper=True)
-def pytest_runtest_makereport(item):
-    outcome = yield
-    report = outcome.get_result()
-    test_key_markers = item.iter_markers(name="xray")
-    report.test_keys = [test_key for test_key_marker in test_key_markers for test_key in test_key_marker.args]
-    node = item.obj
-    report.description = node.__doc__.strip() if node.__doc__ else node.__name__
+    replay_dir = config.getoption(XRAY_REPLAY[0], None)
+    if replay_dir is not None and not config.getoption(JIRA_SERVER[0], None):
+        raise pytest.UsageError(f'{XRAY_REPLAY[1]} requires {JIRA_SERVER[1]}')
+    if config.getoption(XRAY_JSON[0], None) is None and config.getoption(JIRA_SERVER[0], None) is None:
+        return
+    try:
+        comment_policy = CommentPolicy(config.getoption(XRAY_MAX_COMMENT_LENGTH[0], MAX_COMMENT_LENGTH),
+                                       config.getoption(XRAY_COMMENT_TRUNCATION[0], 'head'),
+                                       config.getoption(XRAY_TB_STYLE[0], None))
+    except ValueError as exc:
+        raise pytest.UsageError(str(exc)) from exc
+    config.stash[comment_policy_key] = comment_policy
+    # the per-test hooks are only registered here, an installed but disabled plugin costs nothing per test
+    config.pluginmanager.register(plugin=XrayMetadata(comment_policy), name='pytest_jira_xray_metadata')
+    evidence_dir = getattr(config, 'workerinput', {}).get('xray_evidence_dir') or \
+        config.getoption(XRAY_EVIDENCE_DIR[0], None)
+    evidence_spool = EvidenceSpool(evidence_dir,
+                                   config.getoption(XRAY_EVIDENCE_MAX_TEST_SIZE[0], DEFAULT_EVIDENCE_MAX_TEST_SIZE),
+                                   config.getoption(XRAY_EVIDENCE_MAX_SIZE[0], DEFAULT_EVIDENCE_MAX_RUN_SIZE))
+    config.stash[evidence_spool_key] = evidence_spool
+    if hasattr(config, 'workerinput'):
+        # pytest-xdist worker, test results are folded here and reported by the controller
+        config.pluginmanager.register(plugin=XrayWorker(comment_policy, evidence_spool),
+                                      name='pytest_jira_xray_worker')
+        return
+
+    file_path = config.getoption(XRAY_JSON[1], None)
+    server_url = config.getoption(JIRA_SERVER[0], None)
+    execution_key = config.getoption(XRAY_EXECUTION_KEY, None)
+    test_plan_key = config.getoption(XRAY_TEST_PLAN_KEY[0], None)
+    api_key = config.getoption(JIRA_API_KEY[0], None)
+    token = config.getoption(JIRA_TOKEN, None)
+    basic_auth = config.getoption(JIRA_BASIC_AUTH[0], None)
+    cloud = config.getoption(JIRA_CLOUD, None)
+    stream = config.getoption(XRAY_STREAM[0], False)
+    compact = config.getoption(XRAY_COMPACT[0], False)
+    chunk_size = config.getoption(JIRA_CHUNK_SIZE[0], DEFAULT_CHUNK_SIZE)
+    chunk_bytes = config.getoption(JIRA_CHUNK_BYTES[0], None)
+    upload_workers = config.getoption(JIRA_UPLOAD_WORKERS[0], DEFAULT_UPLOAD_WORKERS)
+    background = config.getoption(JIRA_BACKGROUND[0], False)
+    flush_count = config.getoption(JIRA_FLUSH_COUNT[0], DEFAULT_FLUSH_COUNT)
+    flush_interval = config.getoption(JIRA_FLUSH_INTERVAL[0], DEFAULT_FLUSH_INTERVAL)
+    outbox_dir = config.getoption(XRAY_OUTBOX[0], None)
+    outbox = XrayOutbox(outbox_dir) if outbox_dir and replay_dir is None else None
+    incremental = config.getoption(XRAY_INCREMENTAL[0], False)
+    rerun_iterations = config.getoption(XRAY_RERUN_ITERATIONS[0], False)
+    config.stash[xray_key] = XrayReport(file_path, server_url, execution_key, test_plan_key, api_key, token,
+                                        basic_auth, cloud, stream, compact, chunk_size, chunk_bytes,
+                                        upload_workers, background, flush_count, flush_interval, comment_policy,
+                                        evidence_spool, outbox, incremental, rerun_iterations)
+    if replay_dir is not None:
+        # only the Xray publisher of the report is used, no tests are run and no report is created
+        config.pluginmanager.register(plugin=XrayReplay(XrayOutbox(replay_dir), config.stash[xray_key].xray_publisher),
+                                      name='pytest_jira_xray_replay')
+        return
+    config.pluginmanager.register(plugin=config.stash[xray_key], name='pytest_jira_xray')
 
 
 @pytest.hookimpl(trylast=True)
 def pytest_xray_status_mapping(report_outcome, failure_when, wasxfail):
-    xray_status_map = {
+    if report_outcome == 'failed':
+        return Status.FAIL if failure_when == 'call' else Status.ABORTED
+    if report_outcome == 'skipped':
+        return Status.FAIL if wasxfail else Status.TODO
+    return Status.PASS
+
 
-    }
-    return
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node) -> None:
+    evidence_spool = node.config.stash.get(evidence_spool_key, None)
+    if evidence_spool:
+        # pytest-xdist workers spool their evidence where the controller can read it
+        node.workerinput['xray_evidence_dir'] = str(evidence_spool.directory)
 
+
+@pytest.hookimpl(trylast=True)
 def pytest_unconfigure(config: Config) -> None:
+    xray_metadata = config.pluginmanager.get_plugin('pytest_jira_xray_metadata')
+    if xray_metadata:
+        config.pluginmanager.unregister(xray_metadata)
     xray_report = config.stash.get(xray_key, None)
     if xray_report:
         del config.stash[xray_key]
-        config.pluginmanager.unregister(xray_report)
+        if config.pluginmanager.is_registered(xray_report):
+            config.pluginmanager.unregister(xray_report)
+    xray_replay = config.pluginmanager.get_plugin('pytest_jira_xray_replay')
+    if xray_replay:
+        config.pluginmanager.unregister(xray_replay)
+    evidence_spool = config.stash.get(evidence_spool_key, None)
+    if evidence_spool:
+        del config.stash[evidence_spool_key]
+        evidence_spool.close()
+
+
+@pytest.fixture
+def record_evidence(request: FixtureRequest) -> Callable[..., bool]:
+    """Attach a file, or content given as bytes, as evidence to the Xray result of the calling test.
+
+    Example::
+        def test_function(record_evidence):
+            record_evidence('screenshot.png')
+            record_evidence(b'{"debug": true}', filename='config.json')
+    """
+
+    # Declare noop
+    def record_evidence_noop(source: Union[str, os.PathLike, bytes], filename: Optional[str] = None,
+                             content_type: Optional[str] = None) -> bool:
+        return False
+
+    evidence_spool = request.config.stash.get(evidence_spool_key, None)
+    if evidence_spool is None:
+        return record_evidence_noop
+    return functools.partial(evidence_spool.add, request.node.nodeid)
 
 
-# # def pytest_collection_modifyitems(items: List[Item]) -> None:
-# #     for item in items:
-# #         item.stash[]
-#
-#
 # # TODO Add fixtures for recording test info properties
 # @pytest.fixture
 # def record_requirement(request: FixtureRequest) -> Callable[[str], None]:
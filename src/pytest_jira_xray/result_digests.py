@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from _pytest.cacheprovider import Cache
+
+from .evidence import SpooledEvidence
+
+# Parts of a test result that change with every run without changing the result itself
+_VOLATILE_FIELDS = ('start', 'finish')
+
+
+def _cache_key(execution_key: str) -> str:
+    return f'xray/digests/{execution_key}'
+
+
+def _digest_default(obj: Any) -> Any:
+    if isinstance(obj, SpooledEvidence):
+        # spool files are named after the hash of their content, no need to read them
+        return os.path.basename(obj.path)
+    return str(obj)
+
+
+def result_digest(test_json: dict) -> str:
+    """Return a digest of the status and the content of a test result, ignoring its start and finish time."""
+    content = {name: value for name, value in test_json.items() if name not in _VOLATILE_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, default=_digest_default).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class ResultDigests:
+    """
+    Digests of the test results uploaded to each test execution, kept in the pytest cache.
+
+    A result whose digest matches the one last uploaded to the same test execution is unchanged and
+    need not be uploaded again. The digests of this run only replace the cached ones after a successful upload.
+    """
+
+    def __init__(self, cache: Cache, execution_key: Optional[str] = None) -> None:
+        self.cache = cache
+        self.execution_key = execution_key
+        self.uploaded: Dict[str, str] = cache.get(_cache_key(execution_key), {}) if execution_key else {}
+        self.current: Dict[str, str] = dict()
+        self.skipped = 0
+
+    def is_unchanged(self, test_json: dict) -> bool:
+        """Record the digest of a test result and tell whether it was uploaded to the test execution before."""
+        test_key = test_json.get('testKey')
+        if test_key is None:
+            return False
+        digest = self.current[test_key] = result_digest(test_json)
+        if self.uploaded.get(test_key) == digest:
+            self.skipped += 1
+            return True
+        return False
+
+    def save(self, execution_key: str) -> None:
+        """Remember the digests of this run for the test execution its results were uploaded to."""
+        digests = {**self.uploaded, **self.current} if execution_key == self.execution_key else self.current
+        self.cache.set(_cache_key(execution_key), digests)
@@ -0,0 +1,96 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from .evidence import json_default
+
+JSON_BACKENDS = ('auto', 'orjson', 'ujson', 'json')
+
+_Encoders = Tuple[Callable[[Any], bytes], Callable[[Any], bytes]]
+
+
+def _orjson_encoders() -> _Encoders:
+    import orjson
+
+    return (lambda obj: orjson.dumps(obj, default=json_default),
+            lambda obj: orjson.dumps(obj, default=json_default, option=orjson.OPT_INDENT_2))
+
+
+def _ujson_encoders() -> _Encoders:
+    import ujson
+
+    options: Dict[str, Any] = dict(default=json_default, ensure_ascii=False, escape_forward_slashes=False)
+    return (lambda obj: ujson.dumps(obj, **options).encode('utf-8'),
+            lambda obj: ujson.dumps(obj, indent=2, **options).encode('utf-8'))
+
+
+def _json_encoders() -> _Encoders:
+    # json.dumps creates a new encoder for every call with options, these are created once
+    compact = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':'))
+    indented = json.JSONEncoder(default=json_default, ensure_ascii=False, indent=2)
+    return (lambda obj: compact.encode(obj).encode('utf-8'),
+            lambda obj: indented.encode(obj).encode('utf-8'))
+
+
+# Backends by preference, the first installed one is used by 'auto'
+_BACKENDS: Dict[str, Callable[[], _Encoders]] = {
+    'orjson': _orjson_encoders,
+    'ujson': _ujson_encoders,
+    'json': _json_encoders,
+}
+
+
+class JsonSerializer:
+    """
+    Encode JSON straight to UTF-8 bytes, shared by the report file and the upload.
+
+    With the 'auto' backend orjson or ujson is used when installed, the json module of the standard library
+    otherwise. All backends call json_default for objects they cannot encode, e.g. spooled evidence.
+    """
+
+    def __init__(self, backend: str = 'auto') -> None:
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f'JSON backend must be one of {", ".join(JSON_BACKENDS)}')
+        if backend == 'auto':
+            for backend, encoders in _BACKENDS.items():
+                try:
+                    self._dumps, self._dumps_indented = encoders()
+                except ImportError:
+                    continue
+                break
+        else:
+            try:
+                self._dumps, self._dumps_indented = _BACKENDS[backend]()
+            except ImportError as exc:
+                raise ImportError(f"The {backend} JSON backend requires the '{backend}' package") from exc
+        self.backend = backend
+
+    def dumps(self, obj: Any, indent: bool = False) -> bytes:
+        """Encode compact, or indented by two spaces."""
+        return self._dumps_indented(obj) if indent else self._dumps(obj)
+
+
+def iter_report(header: bytes, tests: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Yield the parts of a compact report made of an encoded report without its tests and the encoded test results.
+
+    The test results are taken one at a time, so a report can be written without ever being held in memory.
+
+    :param header: the encoded report fields, a JSON object
+    :param tests: the encoded test results
+    """
+    yield b'{"tests":[' if header == b'{}' else header[:-1] + b',"tests":['
+    for index, test in enumerate(tests):
+        if index:
+            yield b','
+        yield test
+    yield b']}'
+
+
+def join_report(header: bytes, tests: Iterable[bytes]) -> bytes:
+    """
+    Join an encoded report without its tests and the encoded test results into a compact report, see iter_report.
+
+    :param header: the encoded report fields, a JSON object
+    :param tests: the encoded test results
+    """
+    return b''.join(iter_report(header, tests))
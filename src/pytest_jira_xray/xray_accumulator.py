@@ -0,0 +1,90 @@
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from _pytest.reports import TestReport
+
+from .comment_policy import DEFAULT_COMMENT_POLICY, CommentPolicy
+
+
+@dataclass
+class XrayTestAccumulator:
+    """
+    Compact per-nodeid state folded from the setup/call/teardown reports of a single test.
+
+    Only the data needed to build the Xray result is kept, so the full TestReport objects
+    (tracebacks, captured output, sections) can be released as soon as they are logged.
+    Failed attempts of a test rerun by pytest-rerunfailures are kept as [failure_when, duration]
+    records in reruns. Start and stop span all attempts, all other fields describe the last attempt.
+    """
+    nodeid: str
+    test_keys: list[str] = field(default_factory=list)
+    parameters: dict[str, str] = field(default_factory=dict)
+    callspec_id: str = ''
+    evidence: list = field(default_factory=list)
+    outcome: str = 'passed'
+    failure_when: Optional[str] = None
+    wasxfail: bool = False
+    duration: float = 0.0
+    text: str = ''
+    reruns: list = field(default_factory=list)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+
+    def add(self, report: TestReport, policy: CommentPolicy = DEFAULT_COMMENT_POLICY) -> None:
+        """
+        Fold a single phase report into the accumulator.
+
+        :param report: the report logged by pytest for one of the test phases
+        :param policy: how much of the failure text is kept for the comment
+        """
+        # epoch timestamps of the phase, formatted only once the result of the test is built, 0 when unknown
+        if self.start is None:
+            self.start = getattr(report, 'start', 0) or None
+        self.stop = getattr(report, 'stop', 0) or self.stop
+        if report.outcome == 'rerun':
+            # a failed attempt, pytest-rerunfailures runs the test again starting with its setup
+            self.reruns.append([report.when, self.duration + getattr(report, 'duration', 0.0)])
+            self.duration = 0.0
+            return
+        if report.when == 'setup':
+            self.test_keys = getattr(report, 'test_keys', self.test_keys)
+            self.parameters = getattr(report, 'parameters', self.parameters)
+            self.callspec_id = getattr(report, 'callspec_id', self.callspec_id)
+
+        self.duration += getattr(report, 'duration', 0.0)
+        if report.outcome != 'passed' and self.outcome == 'passed':
+            self.outcome = report.outcome
+            self.failure_when = report.when
+        if hasattr(report, 'wasxfail'):
+            self.wasxfail = True
+
+        if report.longrepr is None:
+            return
+        if policy.is_full(self.text):
+            return  # nothing more would be kept, skip rendering the failure
+        if isinstance(report.longrepr, tuple):
+            # skip reports carry a (path, lineno, reason) tuple, only the reason is of interest
+            text = report.longrepr[2]
+        else:
+            text = getattr(report, 'xray_text', None) or policy.render(report)
+        # the texts of several failing phases, e.g. call and teardown, each start on a new line
+        self.text = policy.truncate(f'{self.text}\n{text}' if self.text else text)
+
+    @property
+    def attempts(self) -> int:
+        return len(self.reruns) + 1
+
+    def to_serializable(self) -> dict:
+        """
+        Return the accumulated state as plain data, e.g. to send it from a pytest-xdist worker to the controller.
+
+        The node id and all fields left at their default are omitted to keep the data small.
+        """
+        return {name: value for name, value in asdict(self).items() if name != 'nodeid' and value != _DEFAULTS[name]}
+
+    @classmethod
+    def from_serializable(cls, nodeid: str, data: dict) -> 'XrayTestAccumulator':
+        return cls(nodeid, **data)
+
+
+_DEFAULTS = asdict(XrayTestAccumulator(''))
@@ -0,0 +1,43 @@
+from typing import List
+
+import pytest
+from _pytest.nodes import Item
+from _pytest.runner import CallInfo
+
+from .comment_policy import DEFAULT_COMMENT_POLICY, CommentPolicy
+from .helper import collect_metadata, get_callspec_id, get_parameters, get_test_keys
+
+
+class XrayMetadata:
+    """
+    Attach the Xray metadata of each test item to its reports.
+
+    Registered only when a report is written or uploaded, so pytest runs none of these
+    per-test hooks while the plugin is installed but not enabled.
+    """
+
+    def __init__(self, comment_policy: CommentPolicy = DEFAULT_COMMENT_POLICY):
+        self.comment_policy = comment_policy
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items: List[Item]) -> None:
+        # after deselection, so only the metadata of the tests that run is looked up
+        for item in items:
+            collect_metadata(item)
+
+    @pytest.hookimpl(tryfirst=True, hookwrapper=True)
+    def pytest_runtest_makereport(self, item: Item, call: CallInfo):
+        outcome = yield
+        report = outcome.get_result()
+        tb_style = self.comment_policy.tb_style
+        if tb_style and report.failed and call.excinfo is not None:
+            report.xray_text = self.comment_policy.render(item._repr_failure_py(call.excinfo, style=tb_style))
+        if report.when == 'setup':
+            # the metadata is read from the setup report only
+            report.test_keys = get_test_keys(item)
+            parameters = get_parameters(item)
+            if parameters:
+                report.parameters = parameters
+            callspec_id = get_callspec_id(item)
+            if callspec_id:
+                report.callspec_id = callspec_id
@@ -1,11 +1,35 @@
+import base64
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import itertools
 import json
 import logging
-from typing import Union
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import AuthBase
+from urllib3.util.retry import Retry
 
-from .constants import AUTHENTICATE_ENDPOINT
+from .constants import (
+    AUTHENTICATE_ENDPOINT,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    DEFAULT_TOKEN_LIFETIME,
+    DEFAULT_UPLOAD_WORKERS,
+    TOKEN_EXPIRY_MARGIN,
+)
+from .exceptions import XrayChunkError, XrayError
+from .serializer import JsonSerializer, iter_report, join_report
+
+if TYPE_CHECKING:
+    from .outbox import XrayOutbox
 
 _logger = logging.getLogger(__name__)
 
@@ -21,20 +45,67 @@ class TokenAuth(AuthBase):
         return r
 
 
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES) -> requests.Session:
+    """
+    Create an HTTP session keeping up to pool_size connections alive per host.
+
+    Connection errors are retried with backoff, a request whose response was not received
+    is not sent again. Of the error responses only 429 and 503 are retried, honouring their
+    Retry-After header: they state the request was not processed, whereas a POST answered
+    by 502 or 504 may have created the test execution already.
+
+    :param pool_size: number of connections kept open per host
+    :param retries: number of retries for a single request
+    """
+    retry = Retry(
+        total=retries,
+        read=0,
+        backoff_factor=0.25,
+        status_forcelist=(429, 503),
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
 class ClientSecretAuth(AuthBase):
+    """
+    Bearer Token Authentication with a token obtained from the client ID and client secret.
+
+    The token is cached until shortly before it expires, and optionally in a file shared
+    between processes, e.g. pytest-xdist workers. A 401 response invalidates the cached
+    token and the request is sent once more with a fresh one.
+    """
 
-    def __init__(self, base_url: str, client_id: str, client_secret: str) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        client_secret: str,
+        session: Optional[requests.Session] = None,
+        token_cache: Optional[str] = None
+    ) -> None:
         if base_url.endswith('/'):
             base_url = base_url[:-1]
         self.base_url = base_url
         self.client_id = client_id
         self.client_secret = client_secret
+        self.session = session
+        self.token_cache: Optional[Path] = Path(token_cache) if token_cache else None
+        self._token: Optional[str] = None
+        self._expires: float = 0.0
+        self._lock = threading.Lock()
 
     @property
     def endpoint_url(self) -> str:
         return f'{self.base_url}{AUTHENTICATE_ENDPOINT}'
 
-    def __call__(self, r: requests.PreparedRequest) -> requests.PreparedRequest:
+    def _authenticate(self) -> str:
         headers = {
             'Content-type': 'application/json',
             'Accept': 'text/plain'
@@ -45,21 +116,106 @@ class ClientSecretAuth(AuthBase):
         }
 
         try:
-            response = requests.post(
+            response = (self.session or requests).post(
                 self.endpoint_url,
                 data=json.dumps(auth_data),
-                headers=headers
+                headers=headers,
+                timeout=DEFAULT_TIMEOUT
             )
-        except requests.exceptions.ConnectionError as exc:
-            err_message = f'ConnectionError: cannot authenticate with {self.endpoint_url}'
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+            err_message = f'{type(exc).__name__}: cannot authenticate with {self.endpoint_url}'
             _logger.exception(err_message)
             raise ValueError(err_message) from exc
-        else:
-            auth_token = response.text.replace('"', '')
-            r.headers['Authorization'] = f'Bearer {auth_token}'
+        if not response.ok:
+            err_message = (f'HTTPError: cannot authenticate with {self.endpoint_url}. '
+                           f'Response status code: {response.status_code}')
+            _logger.error(err_message)
+            raise ValueError(err_message)
+        return response.text.replace('"', '')
+
+    def _is_valid(self, expires: float) -> bool:
+        return time.time() < expires - TOKEN_EXPIRY_MARGIN
+
+    def _read_token_cache(self) -> Optional[Tuple[str, float]]:
+        try:
+            cache = json.loads(self.token_cache.read_text())
+        except (OSError, ValueError):
+            return None
+        if cache.get('client_id') != self.client_id or not self._is_valid(cache.get('expires', 0.0)):
+            return None
+        return cache['token'], cache['expires']
+
+    def _write_token_cache(self, token: str, expires: float) -> None:
+        cache = json.dumps({'client_id': self.client_id, 'token': token, 'expires': expires})
+        try:
+            self.token_cache.parent.mkdir(parents=True, exist_ok=True)
+            # mkstemp creates a file readable by the owner only, os.replace makes the update atomic for readers
+            fd, temp_path = tempfile.mkstemp(prefix=f'.{self.token_cache.name}.', dir=self.token_cache.parent)
+            with open(fd, 'w') as cache_file:
+                cache_file.write(cache)
+            os.replace(temp_path, self.token_cache)
+        except OSError:
+            _logger.warning('Cannot write token cache file %s', self.token_cache, exc_info=True)
+
+    def get_token(self) -> str:
+        """Return a valid token, authenticating only when no unexpired token is cached."""
+        with self._lock:
+            if self._token is not None and self._is_valid(self._expires):
+                return self._token
+            cached = self._read_token_cache() if self.token_cache else None
+            if cached is not None:
+                self._token, self._expires = cached
+                return self._token
+            token = self._authenticate()
+            self._token, self._expires = token, _token_expiry(token)
+            if self.token_cache:
+                self._write_token_cache(self._token, self._expires)
+            return self._token
+
+    def invalidate(self, token: str) -> None:
+        """Drop the cached token, unless another thread has already replaced it."""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._expires = 0.0
+                cached = self._read_token_cache() if self.token_cache else None
+                if cached is not None and cached[0] == token:
+                    try:
+                        self.token_cache.unlink()
+                    except OSError:
+                        pass
+
+    def _handle_401(self, response: requests.Response, **kwargs) -> requests.Response:
+        if response.status_code != 401 or getattr(response.request, 'xray_token_retry', False):
+            return response
+        self.invalidate(response.request.headers['Authorization'][len('Bearer '):])
+        # Consume the content to release the connection back to the pool
+        response.content
+        response.close()
+        prepared_request = response.request.copy()
+        prepared_request.xray_token_retry = True
+        prepared_request.headers['Authorization'] = f'Bearer {self.get_token()}'
+        retried_response = response.connection.send(prepared_request, **kwargs)
+        retried_response.history.append(response)
+        retried_response.request = prepared_request
+        return retried_response
+
+    def __call__(self, r: requests.PreparedRequest) -> requests.PreparedRequest:
+        r.headers['Authorization'] = f'Bearer {self.get_token()}'
+        r.register_hook('response', self._handle_401)
         return r
 
 
+def _token_expiry(token: str) -> float:
+    """Read the expiry time of a JWT token, or assume the default lifetime for other tokens."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return time.time() + DEFAULT_TOKEN_LIFETIME
+
+
 class ApiKeyAuth(AuthBase):
 
     def __init__(self, api_key: str) -> None:
@@ -77,7 +233,16 @@ class XrayPublisher:
         base_url: str,
         endpoint: str,
         auth: Union[AuthBase, tuple],
-        verify: Union[bool, str] = True
+        verify: Union[bool, str] = True,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        retries: int = DEFAULT_RETRIES,
+        session: Optional[requests.Session] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_bytes: Optional[int] = None,
+        upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+        outbox: Optional['XrayOutbox'] = None,
+        serializer: Optional[JsonSerializer] = None
     ) -> None:
         if base_url.endswith('/'):
             base_url = base_url[:-1]
@@ -85,27 +250,43 @@ class XrayPublisher:
         self.endpoint = endpoint
         self.auth = auth
         self.verify = verify
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.upload_workers = max(upload_workers, 1)
+        self.outbox = outbox
+        self.serializer = serializer or JsonSerializer()
+        if session is None:
+            session = create_session(max(pool_size, self.upload_workers), retries)
+        self.session = session
+        if isinstance(auth, ClientSecretAuth) and auth.session is None:
+            auth.session = self.session
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
 
     @property
     def endpoint_url(self) -> str:
         return self.base_url + self.endpoint
 
-    def _send_data(self, url: str, auth: Union[AuthBase, tuple], data: dict) -> dict:
+    def _send_data(self, url: str, auth: Union[AuthBase, tuple], body: bytes) -> dict:
         headers = {
             'Accept': 'application/json',
             'Content-Type': 'application/json'
         }
         try:
-            response = requests.request(
+            response = self.session.request(
                 method='POST',
                 url=url,
                 headers=headers,
-                json=data,
+                data=body,
                 auth=auth,
-                verify=self.verify
+                verify=self.verify,
+                timeout=self.timeout
             )
-        except requests.exceptions.ConnectionError as exc:
-            err_message = f'ConnectionError: cannot connect to JIRA service at {url}'
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+            err_message = f'{type(exc).__name__}: cannot connect to JIRA service at {url}'
             _logger.exception(err_message)
             raise ValueError(err_message) from exc
         else:
@@ -122,14 +303,136 @@ class XrayPublisher:
                 raise ValueError(err_message) from exc
             return response.json()
 
+    @property
+    def chunked(self) -> bool:
+        return bool(self.chunk_size or self.chunk_bytes)
+
+    def _chunks(self, tests: Iterable[bytes]) -> Iterator[Iterable[bytes]]:
+        """
+        Split the encoded test results into chunks bounded by chunk_size tests and roughly chunk_bytes of JSON.
+
+        Without chunking the test results are passed on as they are, chunks are lists taken from them as needed.
+        """
+        if not self.chunked:
+            yield tests
+            return
+        chunk: List[bytes] = []
+        chunk_bytes = 0
+        chunks = 0
+        for test in tests:
+            # the encoded test and the comma separating it from the next one
+            test_bytes = len(test) + 1
+            if chunk and ((self.chunk_size and len(chunk) >= self.chunk_size)
+                          or (self.chunk_bytes and chunk_bytes + test_bytes > self.chunk_bytes)):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+                chunks += 1
+            chunk.append(test)
+            chunk_bytes += test_bytes
+        if chunk or not chunks:
+            yield chunk
+
+    def _publish_chunk(self, body: bytes) -> str:
+        response_data = self._send_data(self.endpoint_url, self.auth, body)
+        # The Xray cloud response does not include the 'testExecIssue' attribute
+        key = response_data['testExecIssue']['key'] if 'testExecIssue' in response_data else response_data['key']
+        return key
+
+    def _publish_chunks(self, key: str,
+                        chunks: Iterator[Sequence[bytes]]) -> Dict[int, Tuple[Sequence[bytes], Exception]]:
+        """
+        Upload the chunks to the test execution, up to upload_workers chunks at the same time.
+
+        At most twice as many chunks as workers are taken from the iterator before their upload
+        finishes, so chunks are not built faster than they can be sent. Chunks that cannot be
+        uploaded are spooled to the outbox, if there is one.
+
+        :return: the failed chunks and their errors by chunk number
+        """
+        errors: Dict[int, Tuple[Sequence[bytes], Exception]] = {}
+
+        header = self.serializer.dumps({'testExecutionKey': key})
+
+        def publish_chunk(chunk: Sequence[bytes]) -> str:
+            body = join_report(header, chunk)
+            try:
+                return self._publish_chunk(body)
+            except Exception:
+                if self.outbox is not None:
+                    self.outbox.put(body)
+                raise
+
+        if self.upload_workers == 1:
+            for index, chunk in enumerate(chunks, start=2):
+                try:
+                    publish_chunk(chunk)
+                except Exception as exc:
+                    errors[index] = (chunk, exc)
+            return errors
+
+        def collect(done_futures):
+            for future in done_futures:
+                index, chunk = pending.pop(future)
+                if future.exception() is not None:
+                    errors[index] = (chunk, future.exception())
+
+        pending: Dict[Future, Tuple[int, Sequence[bytes]]] = {}
+        with ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix='xray-upload') as executor:
+            for index, chunk in enumerate(chunks, start=2):
+                if len(pending) >= 2 * self.upload_workers:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                future = executor.submit(publish_chunk, chunk)
+                pending[future] = (index, chunk)
+            collect(wait(pending).done)
+        return errors
+
     def publish(self, data: dict) -> str:
         """
         Publish results to Jira and return testExecutionId or raise XrayError.
 
+        Large reports are uploaded in chunks, the first chunk creates or updates the test execution
+        and the following chunks add their results to the returned test execution.
+        With an outbox, whatever could not be uploaded is spooled there before the error is raised:
+        the whole report if the first chunk failed, otherwise the failed chunks.
+
         :param data: data to send
         :return: test execution issue id
         """
-        response_data = self._send_data(self.endpoint_url, self.auth, data)
-        # The Xray cloud response does not include the 'testExecIssue' attribute
-        key = response_data['testExecIssue']['key'] if 'testExecIssue' in response_data else response_data['key']
+        header = {name: value for name, value in data.items() if name != 'tests'}
+        return self.publish_encoded(header, (self.serializer.dumps(test) for test in data.get('tests', [])))
+
+    def publish_encoded(self, header: dict, tests: Iterable[bytes]) -> str:
+        """
+        Publish results whose tests are encoded by the serializer of this publisher, see publish.
+
+        The test results are taken as they are needed for the next chunk, only without chunking
+        the body of the whole report is built in memory.
+
+        :param header: report data without the tests
+        :param tests: test results encoded by the serializer of this publisher, e.g. as they are encoded
+        :return: test execution issue id
+        :raise XrayChunkError: if the test execution was created or updated, but some of the following chunks
+            could not be uploaded, with the test execution key and the test results of the failed chunks
+        """
+        encoded_header = self.serializer.dumps(header)
+        chunks = self._chunks(tests)
+        first_chunk = next(chunks)
+        body = join_report(encoded_header, first_chunk)
+        try:
+            key = self._publish_chunk(body)
+        except (ValueError, XrayError) as exc:
+            if self.outbox is None:
+                raise
+            # the whole report, the test results after the first chunk are written to the outbox as they come
+            remaining_tests = itertools.chain.from_iterable(chunks)
+            path = self.outbox.put(iter_report(encoded_header, itertools.chain(first_chunk, remaining_tests))
+                                   if self.chunked else body)
+            raise XrayError(f'{exc}\nThe results were spooled to {path} for --xray-replay') from exc
+        errors = self._publish_chunks(key, chunks)
+        if errors:
+            messages = '\n'.join(f'Chunk {index}: {errors[index][1]}' for index in sorted(errors))
+            if self.outbox is not None:
+                messages += f'\nThe failed chunks were spooled to {self.outbox.directory} for --xray-replay'
+            raise XrayChunkError(f'Could not upload {len(errors)} chunk(s) to test execution {key}:\n{messages}',
+                                 key, [test for index in sorted(errors) for test in errors[index][0]])
         return key
@@ -0,0 +1,54 @@
+from typing import TYPE_CHECKING, Dict, Union
+
+import pytest
+from _pytest.config import Config, ExitCode
+from _pytest.main import Session
+from _pytest.terminal import TerminalReporter
+
+from .outbox import XrayOutbox
+
+if TYPE_CHECKING:
+    from .xray_publisher import XrayPublisher
+
+
+class XrayReplay:
+    """
+    Upload the results spooled to an outbox instead of running tests, see --xray-replay.
+
+    Nothing is collected, the spooled import requests are uploaded in place of the test loop
+    and the session fails if any of them could not be uploaded.
+    """
+
+    def __init__(self, outbox: XrayOutbox, xray_publisher: 'XrayPublisher') -> None:
+        self.outbox = outbox
+        self.xray_publisher = xray_publisher
+        self.results: Dict[str, Union[str, Exception]] = dict()
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection(self, session: Session) -> bool:
+        return True
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session: Session) -> bool:
+        self.results = self.outbox.replay(self.xray_publisher)
+        return True
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionfinish(self, session: Session) -> None:
+        if any(isinstance(result, Exception) for result in self.results.values()):
+            session.exitstatus = ExitCode.TESTS_FAILED
+        elif session.exitstatus == ExitCode.NO_TESTS_COLLECTED:
+            session.exitstatus = ExitCode.OK
+
+    def pytest_terminal_summary(self, terminalreporter: TerminalReporter) -> None:
+        terminalreporter.write_sep('-', 'Jira Xray replay')
+        if not self.results:
+            terminalreporter.write_line(f'No spooled results in {self.outbox.directory}')
+        for name, result in self.results.items():
+            if isinstance(result, Exception):
+                terminalreporter.write_line(f'Could not replay {name}: {result}', red=True)
+            else:
+                terminalreporter.write_line(f'Replayed {name} to Xray test execution: {result}')
+
+    def pytest_unconfigure(self, config: Config) -> None:
+        self.xray_publisher.close()
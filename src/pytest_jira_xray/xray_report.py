@@ -1,5 +1,9 @@
-from collections import defaultdict
-from typing import List, Optional, Union
+import base64
+import binascii
+import logging
+import os
+from collections import Counter
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Union
 
 import pytest
 from _pytest import timing
@@ -10,94 +14,388 @@ from _pytest.reports import TestReport
 from _pytest.runner import CallInfo
 from _pytest.terminal import TerminalReporter
 
+from .comment_policy import DEFAULT_COMMENT_POLICY
+from .constants import (
+    CLOUD_ENDPOINT,
+    DC_ENDPOINT,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_FLUSH_COUNT,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_UPLOAD_WORKERS,
+)
+from .evidence import EvidenceSpool, SpooledEvidence
+from .exceptions import XrayError
 from .file_publisher import FilePublisher
-from .xray_publisher import XrayPublisher
-from .xray_result import XrayExecutionInfo, XrayTest, XrayTestInfo
+from .helper import (
+    _from_environ_or_none,
+    format_timestamp,
+    get_callspec_id,
+    get_test_keys,
+    get_verify_ssl,
+    strip_callspec_id,
+)
+from .payload import XrayPayload
+from .result_digests import ResultDigests
+from .serializer import JsonSerializer
+from .xray_accumulator import XrayTestAccumulator
+from .xray_result import XrayEvidence, XrayExecutionInfo, XrayIteration, XrayParameter, XrayTest, XrayTestInfo
+
+if TYPE_CHECKING:
+    from requests.auth import AuthBase
+
+    from . import background_publisher, xray_publisher
+
+_logger = logging.getLogger(__name__)
+
+# Results are merged by Xray test key, or by the definition of a parametrized test without a key
+_GroupKey = Tuple[Optional[str], Optional[str]]
 
 
 class XrayReport:
 
     def __init__(self, file_path=None, server_url=None, execution_key=None, test_plan_key=None, api_key=None,
-                 token=None, basic_auth=None, cloud=False):
+                 token=None, basic_auth=None, cloud=False, stream=False, compact=False,
+                 chunk_size=DEFAULT_CHUNK_SIZE, chunk_bytes=None, upload_workers=DEFAULT_UPLOAD_WORKERS,
+                 background=False, flush_count=DEFAULT_FLUSH_COUNT, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 comment_policy=DEFAULT_COMMENT_POLICY, evidence_spool=None, outbox=None,
+                 incremental=False, rerun_iterations=False):
         self.cloud = cloud
+        self.comment_policy = comment_policy
+        self.evidence_spool: Optional[EvidenceSpool] = evidence_spool
+        self.stream = stream and file_path is not None
         self.basic_auth = basic_auth
         self.token = token
         self.api_key = api_key
-        self.file_publisher = FilePublisher(file_path)
-        # self.xray_publisher = XrayPublisher(server_url, config)
+        self.serializer = JsonSerializer()
+        self.compact = compact and file_path is not None
+        self.file_publisher = FilePublisher(file_path, compact, self.serializer)
+        self.xray_publisher: Optional['xray_publisher.XrayPublisher'] = None
+        self.background_publisher: Optional['background_publisher.BackgroundPublisher'] = None
+        self.incremental = incremental
+        self.rerun_iterations = rerun_iterations
+        self.result_digests: Optional[ResultDigests] = None
+        if server_url:
+            # requests is only imported when results are uploaded
+            from .background_publisher import BackgroundPublisher
+            from .xray_publisher import XrayPublisher
+
+            self.xray_publisher = XrayPublisher(server_url, CLOUD_ENDPOINT if cloud else DC_ENDPOINT,
+                                                self._create_auth(server_url), get_verify_ssl(),
+                                                chunk_size=chunk_size, chunk_bytes=chunk_bytes,
+                                                upload_workers=upload_workers, outbox=outbox,
+                                                serializer=self.serializer)
+            if background:
+                self.background_publisher = BackgroundPublisher(self.xray_publisher, self._header_json,
+                                                                flush_count, flush_interval)
+        # Finished tests are kept in memory only for outputs that are written at the end of the session
+        self._keep_tests = (file_path is not None and not self.stream) or \
+                           (self.xray_publisher is not None and self.background_publisher is None)
+        # Publishers added by the pytest_xray_publishers hook, after the report file and the Xray server
+        self.publishers: List[Any] = list()
+        self.issue_key: Optional[str] = None
         self.test_execution_key: Optional[str] = execution_key
         self.info: XrayExecutionInfo = XrayExecutionInfo(test_plan_key)
         self._xray_tests: list[XrayTest] = list()
-        self.reports: dict = defaultdict(list)
+        self._accumulators: dict[str, XrayTestAccumulator] = dict()
+        # Results of all items sharing an Xray test key, or all cases of a parametrized test without one,
+        # are merged into one test, which is emitted as soon as the last collected item of the group has finished
+        self._keyed_tests: dict[_GroupKey, XrayTest] = dict()
+        # Encoded size of each distinct evidence file, and the encoded bytes left out of the report by merging tests
+        self._evidence_sizes: dict[str, int] = dict()
+        self.evidence_count = 0
+        self.evidence_saved = 0
+        self._remaining_runs: dict[_GroupKey, int] = dict()
+        self._config: Optional[Config] = None
         self.exception: list = []
 
-    def to_json(self) -> dict:
+    def _create_auth(self, server_url: str) -> Union['AuthBase', tuple, None]:
+        from .xray_publisher import ApiKeyAuth, ClientSecretAuth, TokenAuth
+
+        if self.api_key:
+            return ApiKeyAuth(self.api_key)
+        if self.token:
+            return TokenAuth(self.token)
+        if self.basic_auth:
+            return _decode_basic_auth(self.basic_auth)
+        client_id = _from_environ_or_none('XRAY_CLIENT_ID')
+        client_secret = _from_environ_or_none('XRAY_CLIENT_SECRET')
+        if client_id and client_secret:
+            return ClientSecretAuth(server_url, client_id, client_secret,
+                                    token_cache=_from_environ_or_none('XRAY_TOKEN_CACHE'))
+        user = _from_environ_or_none('XRAY_API_USER')
+        password = _from_environ_or_none('XRAY_API_PASSWORD')
+        if user and password:
+            return user, password
+        return None
+
+    def _header_json(self) -> dict:
         xray_json = {}
         if self.test_execution_key:
             xray_json['testExecutionKey'] = self.test_execution_key
         if info := self.info.to_json():
             xray_json['info'] = info
+        return xray_json
+
+    def to_json(self) -> dict:
+        xray_json = self._header_json()
         xray_json["tests"] = [test.to_json() for test in self._xray_tests]
         return xray_json
 
-    def _finalize(self, session: Session) -> None:
-        hook_execution_key = session.config.hook.pytest_xray_execution_key()
+    def _finish_test(self, accumulator: XrayTestAccumulator) -> None:
+        status = self._config.hook.pytest_xray_status_mapping(report_outcome=accumulator.outcome,
+                                                              failure_when=accumulator.failure_when,
+                                                              wasxfail=accumulator.wasxfail)
+        comment = accumulator.text
+        if accumulator.reruns:
+            failures = ', '.join(f'in {failure_when} after {duration:.2f}s'
+                                 for failure_when, duration in accumulator.reruns)
+            note = (f'Result of attempt {accumulator.attempts}, '
+                    f'the {len(accumulator.reruns)} earlier attempt(s) failed: {failures}')
+            comment = self.comment_policy.truncate(f'{note}\n{comment}' if comment else note)
+        xray_test_dict = dict(status=status, comment=comment or None)
+        if accumulator.start is not None:
+            xray_test_dict['start'] = accumulator.start
+        if accumulator.stop is not None:
+            xray_test_dict['finish'] = accumulator.stop
+        if self.evidence_spool:
+            accumulator.evidence += self.evidence_spool.pop(accumulator.nodeid)
+        if accumulator.evidence:
+            xray_test_dict['evidence'] = tuple(XrayEvidence(SpooledEvidence(path), filename, content_type)
+                                               for path, filename, content_type in accumulator.evidence)
+            for path, _, _ in accumulator.evidence:
+                self._count_evidence(path)
+        rerun_iterations = self.rerun_iterations and accumulator.reruns
+        if accumulator.parameters or rerun_iterations:
+            iteration_name = accumulator.callspec_id
+            parameters = [XrayParameter(name, value) for name, value in accumulator.parameters.items()]
+            if rerun_iterations:
+                statuses = [self._config.hook.pytest_xray_status_mapping(report_outcome='failed',
+                                                                         failure_when=failure_when,
+                                                                         wasxfail=False)
+                            for failure_when, _ in accumulator.reruns]
+                statuses.append(status)
+                attempt_names = [f'{iteration_name} attempt {attempt}' if iteration_name else f'Attempt {attempt}'
+                                 for attempt in range(1, len(statuses) + 1)]
+                # a tuple, so the tests of all keys can share it until merging appends to it
+                xray_test_dict['iterations'] = tuple(
+                    XrayIteration(name=attempt_name, parameters=parameters, status=attempt_status)
+                    for attempt_name, attempt_status in zip(attempt_names, statuses))
+            else:
+                # a tuple, so the tests of all keys can share it until merging appends to it
+                xray_test_dict['iterations'] = (XrayIteration(name=iteration_name, parameters=parameters,
+                                                              status=status),)
+        if accumulator.test_keys:
+            groups = [((test_key, None), XrayTest(test_key=test_key, **xray_test_dict))
+                      for test_key in accumulator.test_keys]
+        elif accumulator.callspec_id:
+            # the cases of a parametrized test become iterations of a single test
+            definition = strip_callspec_id(accumulator.nodeid, accumulator.callspec_id)
+            groups = [((None, definition), XrayTest(test_info=XrayTestInfo(definition=definition), **xray_test_dict))]
+        else:
+            self._emit_test(XrayTest(test_info=XrayTestInfo(definition=accumulator.nodeid), **xray_test_dict))
+            return
+        for group, xray_test in groups:
+            merged = self._keyed_tests.get(group)
+            if merged is None:
+                merged = self._keyed_tests[group] = xray_test
+            else:
+                self._merge(merged, xray_test)
+            remaining = self._remaining_runs.get(group)
+            if remaining is not None:
+                if remaining > 1:
+                    self._remaining_runs[group] = remaining - 1
+                else:
+                    # last collected item of the group, the result is final
+                    del self._remaining_runs[group]
+                    self._emit_test(self._keyed_tests.pop(group))
+
+    def _count_evidence(self, path: str) -> None:
+        if path not in self._evidence_sizes:
+            self._evidence_sizes[path] = os.path.getsize(path)
+        self.evidence_count += 1
+
+    def _merge(self, merged: XrayTest, xray_test: XrayTest) -> None:
+        # attachments the merged test has already are written and uploaded only once
+        dropped = [evidence.data.path for evidence in xray_test.evidence
+                   if evidence in merged.evidence and isinstance(evidence.data, SpooledEvidence)]
+        merged.merge(xray_test, self.comment_policy.truncate)
+        self.evidence_saved += sum(self._evidence_sizes.get(path, 0) for path in dropped)
+
+    def _emit_test(self, xray_test: XrayTest) -> None:
+        if self.stream or self.background_publisher:
+            test_json = xray_test.to_json()
+            upload = self.background_publisher is not None and \
+                not (self.result_digests and self.result_digests.is_unchanged(test_json))
+            # the compact report file and the upload share one encoding of the test
+            test_data = self.serializer.dumps(test_json) if self.stream and self.compact and upload else test_json
+            if self.stream:
+                self.file_publisher.stream_test(test_data)
+            if upload:
+                self.background_publisher.put(test_data)
+        if self._keep_tests:
+            self._xray_tests.append(xray_test)
+
+    def _resolve_execution_key(self, config: Config) -> None:
+        hook_execution_key = config.hook.pytest_xray_execution_key()
         if bool(hook_execution_key) and isinstance(hook_execution_key, str):
             self.test_execution_key = hook_execution_key
+
+    def _start_digests(self, config: Config) -> None:
+        cache = getattr(config, 'cache', None)
+        if self.incremental and self.xray_publisher and cache is not None:
+            self.result_digests = ResultDigests(cache, self.test_execution_key)
+
+    def _finalize(self, session: Session) -> None:
+        self._resolve_execution_key(session.config)
         if (not self.test_execution_key or not isinstance(self.test_execution_key, str)) and not self.info.is_valid():
             raise ValueError(
                 "Report has neither a Test Execution Key nor a Project Key, can't create valid Xray report")
-        for test_name, test_reports in self.reports.items():
-
-            wasxfail = False
-            failure_when = None
-            full_text = ""
-            duration = 0.0
-
-            for test_report in test_reports:
-                if test_report.outcome == "rerun":
-                    # reruns are separate test runs for all intensive purposes
-                    # self.append_rerun(test_report)
-                    print("Handle rerun in an Xray way")
-                else:
-                    full_text += test_report.longreprtext
-                    duration += getattr(test_report, "duration", 0.0)
-
-                    if (
-                        test_report.outcome not in ("passed", "rerun")
-                        and report_outcome == "passed"
-                    ):
-                        report_outcome = test_report.outcome
-                        failure_when = test_report.when
-
-                    if hasattr(test_report, "wasxfail"):
-                        wasxfail = True
-
-            xray_test_dict = dict(status=session.config.hook.pytest_xray_status_mapping(report_outcome, failure_when, wasxfail))
-            if test_report.test_keys:
-                xray_tests = [XrayTest(test_key=test_key, *xray_test_dict) for test_key in test_report.test_keys]
-            else:
-                xray_tests = [XrayTest(test_info=XrayTestInfo(definition=test_report.nodeid), *xray_test_dict)]
-            self._xray_tests += xray_tests
+        # Tests which never reached teardown, e.g. when the session was interrupted
+        for accumulator in self._accumulators.values():
+            self._finish_test(accumulator)
+        self._accumulators.clear()
+        # Keys whose items did not all run, or which were not collected here (pytest-xdist controller)
+        for xray_test in self._keyed_tests.values():
+            self._emit_test(xray_test)
+        self._keyed_tests.clear()
+        self._remaining_runs.clear()
 
     def pytest_sessionstart(self, session: Session):
-        self.info.start_date = timing.time()
+        self._config = session.config
+        self.info.start_date = format_timestamp(timing.time())
+        for result in session.config.hook.pytest_xray_publishers(config=session.config):
+            # a single publisher, or any iterable of them
+            if hasattr(result, 'publish_payload'):
+                self.add_publisher(result)
+            else:
+                for publisher in result:
+                    self.add_publisher(publisher)
+        if self.stream:
+            self.file_publisher.stream_start()
+        if self.background_publisher:
+            self._resolve_execution_key(session.config)
+            self._start_digests(session.config)
+            self.background_publisher.start()
+
+    def pytest_collection_finish(self, session: Session) -> None:
+        self._remaining_runs = Counter(group for item in session.items for group in _groups(item))
 
     def pytest_runtest_logreport(self, report: TestReport):
-        self.reports[report.nodeid].append(report)
+        if hasattr(report, 'xray_result'):
+            # Already folded on a pytest-xdist worker, only the final report of a test carries the result
+            if report.xray_result is not None:
+                self._finish_test(XrayTestAccumulator.from_serializable(report.nodeid, report.xray_result))
+            return
+        accumulator = self._accumulators.get(report.nodeid)
+        if accumulator is None:
+            accumulator = self._accumulators[report.nodeid] = XrayTestAccumulator(report.nodeid)
+        accumulator.add(report, self.comment_policy)
+        if report.when == 'teardown' and report.outcome != 'rerun':
+            self._finish_test(self._accumulators.pop(report.nodeid))
 
     # def pytest_collectreport(self, report: TestReport):
     #     if report.failed:
     #         self.append_failed(report)
 
+    def add_publisher(self, *publishers: Any) -> None:
+        """
+        Add publishers of the report, objects with a publish_payload method.
+
+        The payload is complete only with tests kept until the end of the session, so they are kept from now on.
+        """
+        self.publishers.extend(publishers)
+        self._keep_tests = self._keep_tests or bool(publishers)
+
+    def payload(self) -> XrayPayload:
+        """Build the report once for all publishers."""
+        return XrayPayload(self._header_json(), [xray_test.to_json() for xray_test in self._xray_tests],
+                           self.serializer)
+
     def pytest_sessionfinish(self, session):
-        self.info.finish_date = timing.time()
-        self._finalize(session)
-        self._save_report()
-        # self._publish_report()
+        self.info.finish_date = format_timestamp(timing.time())
+        try:
+            self._finalize(session)
+            payload = self.payload()
+            self._save_report(payload)
+        finally:
+            # a stream not finished by _save_report leaves no partial report behind
+            self.file_publisher.stream_abort()
+        self._publish_report(payload)
+        for publisher in self.publishers:
+            try:
+                publisher.publish_payload(payload)
+            except Exception as exc:
+                _logger.exception('Could not publish results with %r', publisher)
+                self.exception.append(XrayError(f'{type(publisher).__name__}: {exc}'))
+
+    def pytest_unconfigure(self, config: Config) -> None:
+        self.file_publisher.stream_abort()
+        if self.background_publisher:
+            # Upload whatever is left when the session did not finish normally
+            try:
+                self.background_publisher.close()
+            except XrayError:
+                _logger.exception('Could not upload the remaining test results')
+        if self.xray_publisher:
+            self.xray_publisher.close()
 
     def pytest_terminal_summary(self, terminalreporter: TerminalReporter) -> None:
-        terminalreporter.write_sep("-", f"Writing terminal report")
+        terminalreporter.write_sep("-", "Jira Xray report")
+        for line in getattr(self.file_publisher, '_terminal_summary', []):
+            terminalreporter.write_line(line)
+        if self.evidence_count:
+            terminalreporter.write_line(
+                f"Evidence: {self.evidence_count} attachment(s) of {len(self._evidence_sizes)} distinct file(s), "
+                f"deduplication saved {self.evidence_saved} bytes")
+        if self.issue_key:
+            terminalreporter.write_line(f"Uploaded results to Xray test execution: {self.issue_key}")
+        if self.issue_key and self.result_digests and self.result_digests.skipped:
+            terminalreporter.write_line(
+                f"Skipped {self.result_digests.skipped} test result(s) unchanged since the last upload")
+        for exception in self.exception:
+            terminalreporter.write_line(f"Could not publish results to Jira Xray: {exception}", red=True)
+
+    def _publish_report(self, payload: XrayPayload):
+        if not self.xray_publisher:
+            return
+        try:
+            if self.background_publisher:
+                self.issue_key = self.background_publisher.close()
+            else:
+                self._start_digests(self._config)
+                if self.result_digests:
+                    payload = payload.select(lambda test: not self.result_digests.is_unchanged(test))
+                self.issue_key = self.xray_publisher.publish_encoded(payload.header, payload.encoded_tests())
+        except (ValueError, XrayError) as exc:
+            self.exception.append(exc)
+        else:
+            if self.result_digests:
+                self.result_digests.save(self.issue_key)
+
+    def _save_report(self, payload: XrayPayload):
+        if self.stream:
+            self.file_publisher.stream_finish(payload.header)
+        elif self.compact:
+            self.file_publisher.publish_encoded(payload.header, payload.encoded_tests())
+        else:
+            self.file_publisher.publish(payload.to_json())
+
+
+def _groups(item: Item) -> List[_GroupKey]:
+    test_keys = get_test_keys(item)
+    if test_keys:
+        return [(test_key, None) for test_key in test_keys]
+    callspec_id = get_callspec_id(item)
+    return [(None, strip_callspec_id(item.nodeid, callspec_id))] if callspec_id else []
+
 
-    def _save_report(self):
-        self.file_publisher.publish(self.to_json())
+def _decode_basic_auth(basic_auth: str) -> tuple:
+    """Split USERNAME:PASSWORD, given either as plain text or Base64 encoded."""
+    if ':' not in basic_auth:
+        try:
+            basic_auth = base64.b64decode(basic_auth, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError) as exc:
+            raise XrayError('Basic authentication must be given as USERNAME:PASSWORD, optionally Base64 encoded') \
+                from exc
+    user, _, password = basic_auth.partition(':')
+    return user, password
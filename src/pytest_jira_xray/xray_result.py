@@ -1,10 +1,66 @@
-from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional
-
-from _pytest.reports import TestReport
-
-
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+from .comment_policy import DEFAULT_COMMENT_POLICY
+from .evidence import SpooledEvidence
+from .helper import _merge_status, format_timestamp
+
+
+class _LazyList:
+    """
+    A list field allocated on first access, e.g. to append to it.
+
+    Until then the field keeps the sequence it was given in a slot named after it with a leading underscore,
+    by default an empty tuple shared by all instances, so to_json reads the slot to skip empty fields without
+    allocating them.
+    """
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.slot = f'_{name}'
+
+    def __get__(self, obj: Any, objtype: Any = None) -> Any:
+        if obj is None:
+            # the default value of the dataclass field
+            return ()
+        value = getattr(obj, self.slot)
+        if not isinstance(value, list):
+            value = list(value)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: Any, value: Sequence[Any]) -> None:
+        setattr(obj, self.slot, value)
+
+
+def _add_slots(cls):
+    """
+    Recreate a dataclass with __slots__ so its instances carry no per-instance __dict__.
+
+    Equivalent to ``@dataclass(slots=True)``, which is not available before Python 3.10.
+    The slots of _LazyList fields are named after the descriptor, which is kept.
+    """
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(f.name for f in fields(cls))
+    lazy_names = {name for name in field_names if isinstance(cls_dict.get(name), _LazyList)}
+    cls_dict['__slots__'] = tuple(f'_{name}' if name in lazy_names else name for name in field_names)
+    for field_name in field_names:
+        if field_name not in lazy_names:
+            cls_dict.pop(field_name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    qualname = getattr(cls, '__qualname__', None)
+    cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    if qualname is not None:
+        cls.__qualname__ = qualname
+    return cls
+
+
+def _append(obj: Any, name: str, *values: Any) -> None:
+    """Append values to a lazily allocated collection field, replacing the shared empty default on first use."""
+    getattr(obj, name).extend(values)
+
+
+@_add_slots
 @dataclass
 class XrayCustomField:
     id: Optional[str] = None
@@ -14,32 +70,46 @@ class XrayCustomField:
         pass
 
 
+@_add_slots
 @dataclass
 class XrayEvidence:
-    data: Optional[str] = None
+    data: Union[str, SpooledEvidence, None] = None
     filename: Optional[str] = None
     content_type: Optional[str] = None
 
     def to_json(self):
-        pass
+        return {'data': self.data, 'filename': self.filename, 'contentType': self.content_type}
 
 
+@_add_slots
 @dataclass
 class XrayParameter:
     name: Optional[str] = None
     value: Optional[str] = None
 
+    def to_json(self):
+        return {'name': self.name, 'value': self.value}
+
 
+@_add_slots
 @dataclass
 class XrayIteration:
     name: Optional[str] = None
-    parameters: Optional[list[XrayParameter]] = field(default_factory=list)
+    parameters: List[XrayParameter] = _LazyList()
     status: Optional[str] = None
 
     def to_json(self):
-        pass
+        iteration = {}
+        if self.name:
+            iteration['name'] = self.name
+        if self._parameters:
+            iteration['parameters'] = [parameter.to_json() for parameter in self._parameters]
+        if self.status:
+            iteration['status'] = self.status
+        return iteration
 
 
+@_add_slots
 @dataclass
 class XraySteps:
     action: Optional[str] = None
@@ -50,25 +120,26 @@ class XraySteps:
         pass
 
 
+@_add_slots
 @dataclass
 class XrayTestInfo:
     project_key: Optional[str] = None
     summary: Optional[str] = None
     description: Optional[str] = None
     test_type: Optional[str] = None
-    requirement_keys: Optional[list[str]] = field(default_factory=list)
-    labels: Optional[list[str]] = field(default_factory=list)
-    steps: Optional[list[XraySteps]] = field(default_factory=list)
+    requirement_keys: List[str] = _LazyList()
+    labels: List[str] = _LazyList()
+    steps: List[XraySteps] = _LazyList()
     definition: Optional[str] = None
     scenario: Optional[str] = None
-    scenario_type: Optional[list[str]] = field(default_factory=list)
+    scenario_type: List[str] = _LazyList()
 
     def _set_test_type(self):
         if self.definition is not None:
             self.test_type = "Generic"
-        elif self.steps:
+        elif self._steps:
             self.test_type = "Manual"
-        elif self.scenario is not None or self.scenario_type:
+        elif self.scenario is not None or self._scenario_type:
             self.test_type = "Cucumber"
 
     def to_json(self):
@@ -81,18 +152,18 @@ class XrayTestInfo:
             test_info['description'] = self.description
         if self.test_type:
             test_info['test_type'] = self.test_type
-        if self.requirement_keys:
-            test_info['requirement_keys'] = self.requirement_keys
-        if self.labels:
-            test_info['labels'] = self.labels
-        if self.steps:
-            test_info['steps'] = [step.to_json() for step in self.steps]
+        if self._requirement_keys:
+            test_info['requirement_keys'] = self._requirement_keys
+        if self._labels:
+            test_info['labels'] = self._labels
+        if self._steps:
+            test_info['steps'] = [step.to_json() for step in self._steps]
         if self.definition:
             test_info['definition'] = self.definition
         if self.scenario:
             test_info['scenario'] = self.scenario
-        if self.scenario_type:
-            test_info['scenario_type'] = self.scenario_type
+        if self._scenario_type:
+            test_info['scenario_type'] = self._scenario_type
         return test_info
 
     def xray_can_match(self) -> bool:
@@ -102,26 +173,27 @@ class XrayTestInfo:
                      or (self.definition is not None and self.test_type == "Generic")))
 
 
+@_add_slots
 @dataclass
 class XrayTest:
     test_key: Optional[str] = None
     test_info: Optional[XrayTestInfo] = None
-    start: Optional[datetime] = None
-    finish: Optional[datetime] = None
+    # time.time() timestamps, formatted with DATETIME_FORMAT only by to_json
+    start: Optional[float] = None
+    finish: Optional[float] = None
     comment: Optional[str] = None
     executed_by: Optional[str] = None
     assignee: Optional[str] = None
     status: str = field(default="TODO")
-    steps: list[XraySteps] = field(default_factory=list)
-    examples: list[str] = field(default_factory=list)
-    iterations: list[XrayIteration] = field(default_factory=list)
-    defects: list[str] = field(default_factory=list)
-    evidence: list[XrayEvidence] = field(default_factory=list)
-    custom_fields: list[XrayCustomField] = field(default_factory=list)
+    steps: List[XraySteps] = _LazyList()
+    examples: List[str] = _LazyList()
+    iterations: List[XrayIteration] = _LazyList()
+    defects: List[str] = _LazyList()
+    evidence: List[XrayEvidence] = _LazyList()
+    custom_fields: List[XrayCustomField] = _LazyList()
 
     def add_requirement(self, *requirement_keys):
-        for requirement_key in requirement_keys:
-            self.test_info.requirement_keys.append(requirement_key)
+        _append(self.test_info, 'requirement_keys', *requirement_keys)
 
     def to_json(self):
         xray_test = {}
@@ -130,9 +202,9 @@ class XrayTest:
         if self.test_info:
             xray_test['testInfo'] = self.test_info.to_json()
         if self.start:
-            xray_test['start'] = self.start
+            xray_test['start'] = format_timestamp(self.start)
         if self.finish:
-            xray_test['finish'] = self.finish
+            xray_test['finish'] = format_timestamp(self.finish)
         if self.comment:
             xray_test['comment'] = self.comment
         if self.executed_by:
@@ -141,18 +213,18 @@ class XrayTest:
             xray_test['assignee'] = self.assignee
         if self.status:
             xray_test['status'] = self.status
-        if self.steps:
-            xray_test['steps'] = [step.to_json() for step in self.steps]
-        if self.examples:
-            xray_test['examples'] = self.examples
-        if self.iterations:
-            xray_test['iterations'] = [iteration.to_json() for iteration in self.iterations]
-        if self.defects:
-            xray_test['defects'] = self.defects
-        if self.evidence:
-            xray_test['evidence'] = [evidence_item.to_json() for evidence_item in self.evidence]
-        if self.custom_fields:
-            xray_test['customFields'] = [custom_field.to_json() for custom_field in self.custom_fields]
+        if self._steps:
+            xray_test['steps'] = [step.to_json() for step in self._steps]
+        if self._examples:
+            xray_test['examples'] = self._examples
+        if self._iterations:
+            xray_test['iterations'] = [iteration.to_json() for iteration in self._iterations]
+        if self._defects:
+            xray_test['defects'] = self._defects
+        if self._evidence:
+            xray_test['evidence'] = [evidence_item.to_json() for evidence_item in self._evidence]
+        if self._custom_fields:
+            xray_test['customFields'] = [custom_field.to_json() for custom_field in self._custom_fields]
         return xray_test
 
     def validate(self) -> None:
@@ -160,17 +232,67 @@ class XrayTest:
             raise ValueError(
                 "No Test Key was specified, and Test Info was not present for automatic test matching or creation")
 
-    def __add__(self, other):
+    def __iadd__(self, other: 'XrayTest') -> 'XrayTest':
+        if not isinstance(other, XrayTest):
+            return NotImplemented
+        return self.merge(other)
+
+    def merge(self, other: 'XrayTest', truncate: Optional[Callable[[str], str]] = None) -> 'XrayTest':
+        """
+        Merge the result of another run of the same Xray test into this one.
+
+        The highest status wins, comments are joined, the earliest start and the latest finish are kept
+        and all collections are concatenated, leaving out evidence this test already has.
+
+        :param truncate: shortens the joined comment, e.g. CommentPolicy.truncate, by default the one of
+            DEFAULT_COMMENT_POLICY, which keeps the first MAX_COMMENT_LENGTH bytes
+        """
+        if other.test_key != self.test_key:
+            raise ValueError(f"Cannot merge results of different tests {self.test_key} and {other.test_key}")
+        self.status = _merge_status(self.status, other.status)
+        if other.comment:
+            comment = f'{self.comment}{_COMMENT_DIVIDER}{other.comment}' if self.comment else other.comment
+            self.comment = (truncate or DEFAULT_COMMENT_POLICY.truncate)(comment)
+        if other.start and (not self.start or other.start < self.start):
+            self.start = other.start
+        if other.finish and (not self.finish or other.finish > self.finish):
+            self.finish = other.finish
+        self.test_info = self.test_info or other.test_info
+        self.executed_by = self.executed_by or other.executed_by
+        self.assignee = self.assignee or other.assignee
+        # the collections of the other test are read from their slots, so empty ones are not allocated
+        if other._evidence:
+            # the same attachment of several runs is needed only once
+            _append(self, 'evidence', *(evidence for evidence in other._evidence if evidence not in self._evidence))
+        for name in _COLLECTIONS:
+            values = getattr(other, f'_{name}')
+            if name != 'evidence' and values:
+                _append(self, name, *values)
+        return self
+
+    def __add__(self, other: 'XrayTest') -> 'XrayTest':
         if not isinstance(other, XrayTest):
             raise TypeError("Attempting to add unsupported type to the XrayTest report")
+        # the merge appends to the collections, they must not be shared with this test
+        collections = {name: getattr(self, f'_{name}') for name in _COLLECTIONS}
+        merged = replace(self, **{name: list(values) if values else () for name, values in collections.items()})
+        merged += other
+        return merged
 
     def __radd__(self, other):
         if not other:
             return self
         if not isinstance(other, XrayTest):
             raise TypeError(f"Attempting to add {type(other)} to XrayTest")
+        return other + self
+
+
+# Jira wiki markup for a horizontal line between the comments of merged results
+_COMMENT_DIVIDER = '\n----\n'
+_COLLECTIONS = ('steps', 'examples', 'iterations', 'defects', 'evidence', 'custom_fields')
 
 
+@_add_slots
 @dataclass
 class XrayExecutionInfo:
     project: Optional[str] = None
@@ -179,8 +301,8 @@ class XrayExecutionInfo:
     fix_version: Optional[str] = None
     revision: Optional[str] = None
     user: Optional[str] = None
-    start_date: Optional[datetime] = None
-    finish_date: Optional[datetime] = None
+    start_date: Optional[str] = None
+    finish_date: Optional[str] = None
     test_plan_key: Optional[str] = None
     test_environments: Optional[list[str]] = None
 
@@ -0,0 +1,65 @@
+import enum
+from typing import Iterable, Union
+
+
+class Status(str, enum.Enum):
+    TODO = 'TODO'
+    EXECUTING = 'EXECUTING'
+    PENDING = 'PENDING'
+    PASS = 'PASS'
+    FAIL = 'FAIL'
+    ABORTED = 'ABORTED'
+    BLOCKED = 'BLOCKED'
+
+
+# This is the hierarchy of the Status, from bottom to top.
+# When merging two statuses, the highest will be picked.
+STATUS_HIERARCHY = [
+    Status.PASS,
+    Status.TODO,
+    Status.EXECUTING,
+    Status.PENDING,
+    Status.FAIL,
+    Status.ABORTED,
+    Status.BLOCKED,
+]
+
+# Position of each status in STATUS_HIERARCHY, so merging does not have to search the list.
+# Plain strings hash and compare equal to their Status member, so they can be looked up as well.
+STATUS_RANK = {status: rank for rank, status in enumerate(STATUS_HIERARCHY)}
+
+
+# Xray Cloud names of the statuses, ranked like the Status they stand for
+STATUS_ALIASES = {'PASSED': Status.PASS, 'FAILED': Status.FAIL}
+
+# Rank of any other status, e.g. a custom one returned by pytest_xray_status_mapping: above FAIL,
+# so it is not hidden by the result of a passing run, and below ABORTED and BLOCKED
+UNKNOWN_STATUS_RANK = STATUS_RANK[Status.FAIL] + 0.5
+
+
+def status_rank(status: Union[Status, str]) -> float:
+    rank = STATUS_RANK.get(status)
+    if rank is None:
+        rank = STATUS_RANK.get(STATUS_ALIASES.get(status), UNKNOWN_STATUS_RANK)
+    return rank
+
+
+def merge_statuses(statuses: Iterable[Union[Status, str]]) -> Union[Status, str]:
+    """
+    Merge any number of statuses into the highest one in STATUS_HIERARCHY.
+
+    Statuses outside STATUS_HIERARCHY are ranked by status_rank and returned as given, of several statuses
+    of the same rank the first one is kept.
+
+    :raise ValueError: if no status is given
+    """
+    statuses = list(statuses)
+    try:
+        return STATUS_HIERARCHY[max(map(STATUS_RANK.__getitem__, statuses))]
+    except KeyError:
+        pass  # at least one status is unknown, ranking all of them by status_rank is slower
+    except ValueError:
+        raise ValueError('No status to merge') from None
+    status = max(statuses, key=status_rank)
+    rank = STATUS_RANK.get(status)
+    return status if rank is None else STATUS_HIERARCHY[rank]
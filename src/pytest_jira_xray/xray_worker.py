@@ -0,0 +1,42 @@
+from typing import Optional
+
+import pytest
+from _pytest.reports import TestReport
+
+from .comment_policy import DEFAULT_COMMENT_POLICY, CommentPolicy
+from .evidence import EvidenceSpool
+from .xray_accumulator import XrayTestAccumulator
+
+
+class XrayWorker:
+    """
+    Fold the phase reports of each test on a pytest-xdist worker.
+
+    The final report of a test carries the accumulated result in its ``xray_result`` attribute,
+    all other reports carry ``None``, so the controller never has to fold the phase reports itself.
+    """
+
+    def __init__(self, comment_policy: CommentPolicy = DEFAULT_COMMENT_POLICY,
+                 evidence_spool: Optional[EvidenceSpool] = None):
+        self.comment_policy = comment_policy
+        self.evidence_spool = evidence_spool
+        self._accumulators: dict[str, XrayTestAccumulator] = dict()
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_logreport(self, report: TestReport) -> None:
+        # runs before xdist serializes the report for the controller
+        accumulator = self._accumulators.get(report.nodeid)
+        if accumulator is None:
+            accumulator = self._accumulators[report.nodeid] = XrayTestAccumulator(report.nodeid)
+        accumulator.add(report, self.comment_policy)
+        # the accumulator holds all the plugin attributes, no need to send them with every phase
+        for name in ('test_keys', 'parameters', 'callspec_id', 'xray_text'):
+            report.__dict__.pop(name, None)
+        if report.when == 'teardown' and report.outcome != 'rerun':
+            accumulator = self._accumulators.pop(report.nodeid)
+            if self.evidence_spool:
+                # the spool files are shared with the controller, only their paths are sent
+                accumulator.evidence += self.evidence_spool.pop(report.nodeid)
+            report.xray_result = accumulator.to_serializable()
+        else:
+            report.xray_result = None
@@ -0,0 +1,107 @@
+from _pytest.config import ExitCode
+from _pytest.pytester import Pytester
+from flask import jsonify, request
+import pytest
+
+DC_ENDPOINT = '/rest/raven/2.0/import/execution'
+
+
+@pytest.fixture
+def uploads(mock_server):
+    posted = []
+
+    def import_execution():
+        posted.append(request.get_json())
+        return jsonify({'testExecIssue': {'key': 'JIRA-1000'}})
+
+    mock_server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    mock_server.start()
+    return posted
+
+
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'anonymous_pass')
+def test_results_are_uploaded(pytester: Pytester, mock_server, uploads):
+    report = pytester.runpytest(f'--jira-url={mock_server.url}', '--execution=JIRA-1')
+    assert report.ret is ExitCode.TESTS_FAILED
+    report.stdout.fnmatch_lines(['*Uploaded results to Xray test execution: JIRA-1000*'])
+    assert len(uploads) == 1
+    assert uploads[0]['testExecutionKey'] == 'JIRA-1'
+    assert len(uploads[0]['tests']) == 3
+
+
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'anonymous_pass')
+def test_results_are_uploaded_in_chunks(pytester: Pytester, mock_server, uploads):
+    report = pytester.runpytest(f'--jira-url={mock_server.url}', '--test-plan=JIRA-2', '--xray-chunk-size=2')
+    assert report.ret is ExitCode.TESTS_FAILED
+    assert [len(upload['tests']) for upload in uploads] == [2, 1]
+    assert 'testExecutionKey' not in uploads[0]
+    assert uploads[1]['testExecutionKey'] == 'JIRA-1000'
+
+
+def test_upload_error_is_reported(pytester: Pytester, marked_xray_pass, mock_server):
+    report = pytester.runpytest(f'--jira-url={mock_server.url}', '--execution=JIRA-1')
+    assert report.ret is ExitCode.OK
+    report.stdout.fnmatch_lines(['*Could not publish results to Jira Xray: ConnectionError*'])
+
+
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'anonymous_pass')
+def test_results_are_uploaded_in_background(pytester: Pytester, mock_server, uploads):
+    report = pytester.runpytest(f'--jira-url={mock_server.url}', '--execution=JIRA-1', '--xray-background',
+                                '--xray-flush-count=2')
+    assert report.ret is ExitCode.TESTS_FAILED
+    report.stdout.fnmatch_lines(['*Uploaded results to Xray test execution: JIRA-1000*'])
+    assert [len(upload['tests']) for upload in uploads] == [2, 1]
+    assert uploads[0]['testExecutionKey'] == 'JIRA-1'
+    assert 'info' in uploads[-1]
+
+
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'anonymous_pass')
+def test_failed_upload_is_spooled_and_replayed(pytester: Pytester, mock_server):
+    report = pytester.runpytest(f'--jira-url={mock_server.url}', '--execution=JIRA-1', '--xray-outbox=outbox')
+    assert report.ret is ExitCode.TESTS_FAILED
+    report.stdout.fnmatch_lines(['*Could not publish results to Jira Xray: ConnectionError*',
+                                 '*The results were spooled to *outbox* for --xray-replay'])
+    assert len(list(pytester.path.joinpath('outbox').iterdir())) == 1
+
+    posted = []
+
+    def import_execution():
+        posted.append(request.get_json())
+        return jsonify({'testExecIssue': {'key': 'JIRA-1'}})
+
+    mock_server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    mock_server.start()
+    report = pytester.runpytest(f'--jira-url={mock_server.url}', '--xray-replay=outbox')
+    assert report.ret is ExitCode.OK
+    report.stdout.fnmatch_lines(['Replayed *.json to Xray test execution: JIRA-1'])
+    report.stdout.no_fnmatch_line('*passed*')
+    assert len(posted) == 1
+    assert posted[0]['testExecutionKey'] == 'JIRA-1'
+    assert len(posted[0]['tests']) == 3
+    assert not list(pytester.path.joinpath('outbox').iterdir())
+
+
+def test_replay_requires_jira_url(pytester: Pytester):
+    report = pytester.runpytest('--xray-replay=outbox')
+    assert report.ret is ExitCode.USAGE_ERROR
+    report.stderr.fnmatch_lines(['*--xray-replay requires --jira-url*'])
+
+
+@pytest.mark.parametrize('background', [(), ('--xray-background',)])
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'anonymous_pass')
+def test_unchanged_results_are_not_uploaded_again(pytester: Pytester, mock_server, uploads, background):
+    options = (f'--jira-url={mock_server.url}', '--execution=JIRA-1000', '--xray-incremental', *background)
+    pytester.runpytest(*options)
+    report = pytester.runpytest(*options)
+    report.stdout.fnmatch_lines(['*Skipped 2 test result(s) unchanged since the last upload*'])
+    pytester.makepyfile(test_marked_xray_fail="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-2')
+        def test_fail():
+            pass
+    """)
+    pytester.runpytest(*options)
+    # results without a test key are always uploaded
+    assert [sorted(test.get('testKey', '') for test in upload['tests']) for upload in uploads] == [
+        ['', 'JIRA-1', 'JIRA-2'], [''], ['', 'JIRA-2']]
@@ -1,9 +1,13 @@
 import json
+import re
+from datetime import datetime
 
 import pytest
 from _pytest.config import ExitCode
 from _pytest.pytester import Pytester
 
+from pytest_jira_xray.constants import DATETIME_FORMAT
+
 
 def test_report_exists(pytester: Pytester, marked_xray_pass):
     report = pytester.runpytest('--xrayjson=report.json', '--execution=JIRA_EX-1')
@@ -227,3 +231,421 @@ def test_non_marked_tests(pytester, anonymous_pass):
     assert not hasattr(xray_report['tests'][0], 'test_key')
     assert hasattr(xray_report['tests'][0], 'test_info')
     assert hasattr(xray_report['tests'][0]['test_info'], 'test_type')
+
+
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'anonymous_pass')
+def test_streamed_report_matches_report(pytester: Pytester):
+    pytester.runpytest('--xrayjson=report.json', '--execution=JIRA-1')
+    pytester.runpytest('--xrayjson=streamed.json', '--execution=JIRA-1', '--xray-stream')
+    with open(pytester.path.joinpath("report.json")) as f:
+        xray_report = json.load(f)
+    with open(pytester.path.joinpath("streamed.json")) as f:
+        streamed_report = json.load(f)
+    assert len(streamed_report['tests']) == 3
+    # the two runs differ in their start and finish times only
+    streamed_tests, tests = ([{name: value for name, value in test.items() if name not in ('start', 'finish')}
+                              for test in report_json['tests']] for report_json in (streamed_report, xray_report))
+    assert streamed_tests == tests
+    assert streamed_report['testExecutionKey'] == xray_report['testExecutionKey']
+
+
+@pytest.mark.usefixtures('marked_xray_pass', 'marked_xray_fail', 'marked_xray_test_skipped', 'anonymous_pass')
+def test_xdist_report_matches_report(pytester: Pytester):
+    pytest.importorskip('xdist')
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1', '-p', 'no:xdist')
+    report = pytester.runpytest('--xray-json=xdist.json', '--execution=JIRA-1', '-n', '2')
+    report.assert_outcomes(failed=1, passed=2, skipped=1)
+    with open(pytester.path.joinpath('report.json')) as f:
+        expected = json.load(f)
+    with open(pytester.path.joinpath('xdist.json')) as f:
+        actual = json.load(f)
+    # the two runs differ in their start and finish times only
+    assert all('start' in test and 'finish' in test for test in actual['tests'] + expected['tests'])
+    actual_tests, expected_tests = ([{name: value for name, value in test.items() if name not in ('start', 'finish')}
+                                     for test in report_json['tests']] for report_json in (actual, expected))
+    sort_key = json.dumps
+    assert sorted(actual_tests, key=sort_key) == sorted(expected_tests, key=sort_key)
+    assert actual['testExecutionKey'] == expected['testExecutionKey']
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_items_sharing_key_are_merged(pytester: Pytester, stream):
+    pytester.makepyfile(test_shared_key="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        @pytest.mark.parametrize('value', [1, 2, 3])
+        def test_value(value):
+            assert value != 2
+
+        @pytest.mark.xray('JIRA-2')
+        def test_pass():
+            pass
+    """)
+    options = ['--xray-stream'] if stream else []
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', *options)
+    with open(pytester.path.joinpath('report.json')) as f:
+        tests = json.load(f)['tests']
+    assert len(tests) == 2
+    merged = next(test for test in tests if test['testKey'] == 'JIRA-1')
+    assert merged['status'] == 'FAIL'
+    assert merged['comment'].count('assert 2 != 2') == 1
+
+
+def test_parametrized_cases_are_iterations(pytester: Pytester):
+    pytester.makepyfile(test_parametrized="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        @pytest.mark.parametrize('left,right', [(1, 1), (1, 2)], ids=['equal', 'different'])
+        def test_equal(left, right):
+            assert left == right
+    """)
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000')
+    with open(pytester.path.joinpath('report.json')) as f:
+        tests = json.load(f)['tests']
+    assert len(tests) == 1
+    assert tests[0]['status'] == 'FAIL'
+    assert tests[0]['iterations'] == [
+        {'name': 'equal', 'parameters': [{'name': 'left', 'value': '1'}, {'name': 'right', 'value': '1'}],
+         'status': 'PASS'},
+        {'name': 'different', 'parameters': [{'name': 'left', 'value': '1'}, {'name': 'right', 'value': '2'}],
+         'status': 'FAIL'},
+    ]
+
+
+@pytest.mark.parametrize('options', [(), ('--xray-stream',), ('-n', '2')])
+def test_parametrized_cases_without_key_are_iterations(pytester: Pytester, options):
+    pytester.makepyfile(test_parametrized="""
+        import pytest
+
+        @pytest.mark.parametrize('value', [1, 2, 3], ids=['a::b', 'c[d]', 'e'])
+        def test_value(value):
+            assert value != 2
+
+        def test_single():
+            pass
+    """)
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', *options)
+    with open(pytester.path.joinpath('report.json')) as f:
+        tests = {test['testInfo']['definition']: test for test in json.load(f)['tests']}
+    assert set(tests) == {'test_parametrized.py::test_value', 'test_parametrized.py::test_single'}
+    assert 'iterations' not in tests['test_parametrized.py::test_single']
+    parametrized = tests['test_parametrized.py::test_value']
+    assert parametrized['status'] == 'FAIL'
+    assert sorted((iteration['name'], iteration['status']) for iteration in parametrized['iterations']) == [
+        ('a::b', 'PASS'), ('c[d]', 'FAIL'), ('e', 'PASS')]
+
+
+def test_comment_capture_options(pytester: Pytester):
+    pytester.makepyfile(test_long_failure="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_long_failure():
+            text = 'x' * 10_000
+            assert text == 'y'
+    """)
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', '--xray-max-comment-length=200',
+                       '--xray-comment-truncation=tail')
+    with open(pytester.path.joinpath('report.json')) as f:
+        comment = json.load(f)['tests'][0]['comment']
+    assert len(comment) <= 200
+    assert comment.endswith('AssertionError')
+    assert 'def test_long_failure' not in comment
+
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000')
+    with open(pytester.path.joinpath('report.json')) as f:
+        assert 'def test_long_failure' in json.load(f)['tests'][0]['comment']
+
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', '--xray-tb=line')
+    with open(pytester.path.joinpath('report.json')) as f:
+        comment = json.load(f)['tests'][0]['comment']
+    assert 'def test_long_failure' not in comment
+    assert 'AssertionError' in comment
+
+
+@pytest.mark.parametrize('truncation', ['head', 'tail'])
+def test_merged_comment_follows_comment_policy(pytester: Pytester, truncation):
+    pytester.makepyfile(test_shared_failures="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        @pytest.mark.parametrize('value', range(5))
+        def test_value(value):
+            assert value == 'x' * 100
+    """)
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', '--xray-max-comment-length=200',
+                       f'--xray-comment-truncation={truncation}')
+    with open(pytester.path.joinpath('report.json')) as f:
+        [test] = json.load(f)['tests']
+    assert len(test['comment']) <= 200
+    assert test['comment'].endswith('AssertionError') is (truncation == 'tail')
+
+
+def test_comment_length_below_truncation_marker(pytester: Pytester):
+    result = pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', '--xray-max-comment-length=3')
+    assert result.ret == ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(['*Maximum comment length must be at least 7 bytes*'])
+
+
+@pytest.mark.parametrize('xdist', [False, True])
+def test_record_evidence(pytester: Pytester, xdist):
+    if xdist:
+        pytest.importorskip('xdist')
+    pytester.makepyfile(test_evidence="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_evidence(record_evidence, tmp_path):
+            screenshot = tmp_path / 'screenshot.png'
+            screenshot.write_bytes(b'png')
+            record_evidence(screenshot)
+            record_evidence(b'log line', filename='test.log', content_type='text/plain')
+    """)
+    options = ['-n', '1'] if xdist else []
+    pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', *options)
+    with open(pytester.path.joinpath('report.json')) as f:
+        tests = json.load(f)['tests']
+    assert tests[0]['evidence'] == [
+        {'data': 'cG5n', 'filename': 'screenshot.png', 'contentType': 'image/png'},
+        {'data': 'bG9nIGxpbmU=', 'filename': 'test.log', 'contentType': 'text/plain'},
+    ]
+
+
+def test_record_evidence_without_report(pytester: Pytester):
+    pytester.makepyfile(test_evidence="""
+        def test_evidence(record_evidence):
+            assert record_evidence(b'content', filename='test.log') is False
+    """)
+    pytester.runpytest().assert_outcomes(passed=1)
+
+
+def test_shared_evidence_is_deduplicated(pytester: Pytester):
+    pytester.makepyfile(test_evidence="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        @pytest.mark.parametrize('value', range(3))
+        def test_evidence(record_evidence, value):
+            record_evidence(b'environment', filename='environment.txt')
+            record_evidence(str(value).encode(), filename=f'value-{value}.txt')
+    """)
+    report = pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000')
+    report.stdout.fnmatch_lines(['Evidence: 6 attachment(s) of 4 distinct file(s), deduplication saved 32 bytes'])
+    with open(pytester.path.joinpath('report.json')) as f:
+        tests = json.load(f)['tests']
+    assert [evidence['filename'] for evidence in tests[0]['evidence']] == [
+        'environment.txt', 'value-0.txt', 'value-1.txt', 'value-2.txt']
+
+
+@pytest.mark.parametrize('options', [(), ('--xray-json=report.json', '--execution=JIRA-1000')])
+def test_metadata_is_looked_up_once_when_active(pytester: Pytester, options):
+    pytester.makeconftest("""
+        from pytest_jira_xray.helper import test_keys_key
+
+        def pytest_runtest_logreport(report):
+            if report.when == 'setup':
+                with open('metadata.txt', 'a') as f:
+                    f.write(f"{getattr(report, 'test_keys', None)}\\n")
+
+        def pytest_collection_finish(session):
+            with open('metadata.txt', 'a') as f:
+                f.write(f"{[test_keys_key in item.stash for item in session.items]}\\n")
+    """)
+    pytester.makepyfile(test_metadata="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_metadata():
+            '''Description.'''
+
+        def test_deselected():
+            pass
+    """)
+    pytester.runpytest('-k', 'not deselected', *options).assert_outcomes(passed=1)
+    lines = pytester.path.joinpath('metadata.txt').read_text().splitlines()
+    if options:
+        assert lines == ['[True]', "['JIRA-1']"]
+    else:
+        assert lines == ['[False]', 'None']
+
+
+@pytest.mark.parametrize('options,registered', [((), False), (('--xray-json=report.json',), True)])
+def test_per_test_hooks_registered_when_enabled(pytester: Pytester, options, registered):
+    config = pytester.parseconfigure(*options)
+    assert (config.pluginmanager.get_plugin('pytest_jira_xray_metadata') is not None) is registered
+
+
+def test_publisher_not_imported_without_server(pytester: Pytester):
+    pytester.makepyfile(test_imports="""
+        import sys
+
+        def test_imports():
+            assert 'requests' not in sys.modules
+            assert 'pytest_jira_xray.xray_publisher' not in sys.modules
+    """)
+    result = pytester.runpytest_subprocess('--xray-json=report.json', '--execution=JIRA-1000')
+    result.assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize('options', [(), ('-n', '2')])
+def test_rerun_attempts_are_recorded(pytester: Pytester, options):
+    pytester.makepyfile(test_flaky="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        @pytest.mark.parametrize('value', ['a'])
+        def test_flaky(tmp_path_factory, value):
+            attempts = tmp_path_factory.getbasetemp().parent / 'attempts'
+            attempts.mkdir(exist_ok=True)
+            (attempts / str(len(list(attempts.iterdir())))).touch()
+            assert len(list(attempts.iterdir())) > 2
+    """)
+    report = pytester.runpytest('-p', 'rerunfailures', '--reruns=3', '--xray-json=report.json',
+                                '--execution=JIRA-1000', '--xray-rerun-iterations', *options)
+    assert report.parseoutcomes() == {'passed': 1, 'rerun': 2}
+    with open(pytester.path.joinpath('report.json')) as f:
+        [test] = json.load(f)['tests']
+    assert test['status'] == 'PASS'
+    assert re.fullmatch(r'Result of attempt 3, the 2 earlier attempt\(s\) failed: '
+                        r'in call after \d+\.\d\ds, in call after \d+\.\d\ds', test['comment'])
+    assert [(iteration['name'], iteration['status']) for iteration in test['iterations']] == [
+        ('a attempt 1', 'FAIL'), ('a attempt 2', 'FAIL'), ('a attempt 3', 'PASS')]
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_custom_publishers_share_encoded_payload(pytester: Pytester, stream):
+    pytester.makeconftest("""
+        import json
+        from pathlib import Path
+
+        class CopyPublisher:
+            def __init__(self, path):
+                self.path = path
+
+            def publish_payload(self, payload):
+                Path(self.path).write_bytes(payload.encode())
+
+        class BrokenPublisher:
+            def publish_payload(self, payload):
+                raise OSError('disk full')
+
+        def pytest_xray_publishers(config):
+            return [CopyPublisher('copy.json'), BrokenPublisher()]
+    """)
+    pytester.makepyfile(test_publishers="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_pass():
+            pass
+
+        @pytest.mark.xray('JIRA-2')
+        def test_fail():
+            assert False
+    """)
+    options = ('--xray-stream',) if stream else ()
+    result = pytester.runpytest('--xray-json=report.json', '--xray-compact', '--execution=JIRA-1000', *options)
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(['*Could not publish results*BrokenPublisher: disk full*'])
+    report = json.loads(pytester.path.joinpath('report.json').read_bytes())
+    copy = json.loads(pytester.path.joinpath('copy.json').read_bytes())
+    assert copy == report
+    assert [test['testKey'] for test in copy['tests']] == ['JIRA-1', 'JIRA-2']
+
+
+def test_hook_may_return_single_publisher(pytester: Pytester):
+    pytester.makeconftest("""
+        from pathlib import Path
+
+        class CopyPublisher:
+            def publish_payload(self, payload):
+                Path('copy.json').write_bytes(payload.encode())
+
+        def pytest_xray_publishers(config):
+            return CopyPublisher()
+    """)
+    pytester.makepyfile(test_publishers="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_pass():
+            pass
+    """)
+    result = pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000')
+    result.assert_outcomes(passed=1)
+    result.stdout.no_fnmatch_line('*Could not publish results*')
+    copy = json.loads(pytester.path.joinpath('copy.json').read_bytes())
+    assert [test['testKey'] for test in copy['tests']] == ['JIRA-1']
+
+
+@pytest.mark.parametrize('options', [(), ('-n', '2')])
+def test_report_has_timestamps(pytester: Pytester, options):
+    pytester.makepyfile(test_timestamps="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_first():
+            pass
+
+        @pytest.mark.xray('JIRA-2')
+        def test_second():
+            pass
+    """)
+    before = datetime.now().astimezone().replace(microsecond=0)
+    result = pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000', *options)
+    after = datetime.now().astimezone()
+    result.assert_outcomes(passed=2)
+    with open(pytester.path.joinpath('report.json')) as f:
+        report = json.load(f)
+    start_date = datetime.strptime(report['info']['startDate'], DATETIME_FORMAT)
+    finish_date = datetime.strptime(report['info']['finishDate'], DATETIME_FORMAT)
+    assert before <= start_date <= finish_date <= after
+    for test in report['tests']:
+        assert start_date <= datetime.strptime(test['start'], DATETIME_FORMAT) \
+            <= datetime.strptime(test['finish'], DATETIME_FORMAT) <= finish_date
+
+
+def test_custom_statuses_of_shared_key_are_merged(pytester: Pytester):
+    pytester.makeconftest("""
+        def pytest_xray_status_mapping(report_outcome, failure_when, wasxfail):
+            return 'PASSED' if report_outcome == 'passed' else 'FAILED'
+    """)
+    pytester.makepyfile(test_custom_status="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-2')
+        @pytest.mark.parametrize('value', [1, 2])
+        def test_value(value):
+            assert value == 1
+    """)
+    result = pytester.runpytest('--xray-json=out.json', '--execution=J-1')
+    result.assert_outcomes(passed=1, failed=1)
+    with open(pytester.path.joinpath('out.json')) as f:
+        [test] = json.load(f)['tests']
+    assert test['status'] == 'FAILED'
+    assert [iteration['status'] for iteration in test['iterations']] == ['PASSED', 'FAILED']
+
+
+def test_stream_without_execution_key_leaves_no_file(pytester: Pytester, marked_xray_pass):
+    pytester.runpytest('--xray-json=out.json', '--xray-stream')
+    assert not [path.name for path in pytester.path.iterdir() if path.name.startswith(('.out.json', 'out.json'))]
+
+
+def test_evidence_of_different_keys_saves_nothing(pytester: Pytester):
+    pytester.makepyfile(test_evidence="""
+        import pytest
+
+        @pytest.mark.xray('JIRA-1')
+        def test_first(record_evidence):
+            record_evidence(b'environment', filename='environment.txt')
+
+        @pytest.mark.xray('JIRA-2')
+        def test_second(record_evidence):
+            record_evidence(b'environment', filename='environment.txt')
+    """)
+    report = pytester.runpytest('--xray-json=report.json', '--execution=JIRA-1000')
+    report.stdout.fnmatch_lines(['Evidence: 2 attachment(s) of 1 distinct file(s), deduplication saved 0 bytes'])
+    with open(pytester.path.joinpath('report.json')) as f:
+        assert [len(test['evidence']) for test in json.load(f)['tests']] == [1, 1]
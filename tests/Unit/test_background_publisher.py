@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from unittest import mock
+
+from flask import jsonify, request
+import pytest
+
+from pytest_jira_xray.background_publisher import BackgroundPublisher
+from pytest_jira_xray.evidence import SpooledEvidence
+from pytest_jira_xray.exceptions import XrayError
+from pytest_jira_xray.xray_publisher import XrayPublisher
+
+DC_ENDPOINT = '/rest/raven/2.0/import/execution'
+
+
+@pytest.fixture
+def import_server(mock_server):
+    state = {'uploads': [], 'fail': False}
+    uploaded = threading.Event()
+
+    def import_execution():
+        if state['fail']:
+            return jsonify({'error': 'Service unavailable'}), 400
+        state['uploads'].append(request.get_json())
+        uploaded.set()
+        return jsonify({'key': 'JIRA-1000'})
+
+    mock_server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    mock_server.start()
+    mock_server.state = state
+    mock_server.uploaded = uploaded
+    return mock_server
+
+
+def make_publisher(server, **kwargs) -> BackgroundPublisher:
+    publisher = XrayPublisher(server.url, DC_ENDPOINT, None, retries=0)
+    header = {'info': {'summary': 'Summary'}}
+    return BackgroundPublisher(publisher, lambda: dict(header), **kwargs)
+
+
+def make_tests(count: int) -> list:
+    return [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(count)]
+
+
+def test_flush_by_count(import_server):
+    background = make_publisher(import_server, flush_count=2, flush_interval=60)
+    background.start()
+    for test in make_tests(5):
+        background.put(test)
+    assert background.close() == 'JIRA-1000'
+    uploads = import_server.state['uploads']
+    assert [len(upload['tests']) for upload in uploads] == [2, 2, 1]
+    assert uploads[0]['info'] == {'summary': 'Summary'}
+    assert uploads[1] == {'testExecutionKey': 'JIRA-1000', 'tests': make_tests(5)[2:4]}
+    assert uploads[2]['info'] == {'summary': 'Summary'}
+    assert uploads[2]['testExecutionKey'] == 'JIRA-1000'
+
+
+def test_flush_by_interval(import_server):
+    background = make_publisher(import_server, flush_count=100, flush_interval=0.1)
+    background.start()
+    background.put(make_tests(1)[0])
+    assert import_server.uploaded.wait(timeout=5)
+    assert len(import_server.state['uploads'][0]['tests']) == 1
+    background.close()
+    assert [len(upload['tests']) for upload in import_server.state['uploads']] == [1, 0]
+
+
+def test_failed_upload_is_retried(import_server):
+    import_server.state['fail'] = True
+    background = make_publisher(import_server, flush_count=2, flush_interval=60)
+    background.start()
+    for test in make_tests(3):
+        background.put(test)
+    time.sleep(0.2)
+    import_server.state['fail'] = False
+    assert background.close() == 'JIRA-1000'
+    assert import_server.state['uploads'][0]['tests'] == make_tests(3)
+
+
+def test_close_raises_when_results_remain(import_server):
+    import_server.state['fail'] = True
+    background = make_publisher(import_server, flush_count=2, flush_interval=60)
+    background.start()
+    for test in make_tests(3):
+        background.put(test)
+    with pytest.raises(XrayError, match='3 test result'):
+        background.close()
+
+
+def test_unexpected_upload_error_is_reported(import_server):
+    background = make_publisher(import_server, flush_count=1, flush_interval=60)
+    # a response without the test execution key
+    with mock.patch.object(background.publisher, '_send_data', return_value={}):
+        background.start()
+        background.put(make_tests(1)[0])
+        with pytest.raises(XrayError, match="1 test result.*not uploaded: 'key'"):
+            background.close()
+
+
+def test_unencodable_result_is_reported(import_server, tmp_path):
+    background = make_publisher(import_server, flush_count=1, flush_interval=60)
+    background.start()
+    background.put({'testKey': 'JIRA-1', 'status': 'PASS', 'evidence': [SpooledEvidence(str(tmp_path / 'gone.b64'))]})
+    background.put(make_tests(3)[2])
+    with pytest.raises(XrayError, match='1 test result.*could not be encoded'):
+        background.close()
+    assert [upload['tests'] for upload in import_server.state['uploads']][0] == make_tests(3)[2:]
+
+
+def test_results_left_by_stopped_thread_are_reported(import_server):
+    publisher = XrayPublisher(import_server.url, DC_ENDPOINT, None, retries=0)
+
+    def header():
+        raise RuntimeError('broken header')
+
+    background = BackgroundPublisher(publisher, header, flush_count=1, flush_interval=60)
+    background.start()
+    for test in make_tests(3):
+        background.put(test)
+    background._thread.join(timeout=5)
+    background.put(make_tests(4)[3])
+    with pytest.raises(XrayError, match='test result.*not uploaded: broken header'):
+        background.close()
+
+
+def test_failed_chunk_is_retried_in_created_execution():
+    publisher = XrayPublisher('http://localhost', DC_ENDPOINT, None, chunk_size=2)
+    posted = []
+
+    def send_data(url, auth, body):
+        posted.append(json.loads(body))
+        if len(posted) == 2:
+            raise ValueError('Chunk 2 failed')
+        return {'key': 'JIRA-1000'}
+
+    background = BackgroundPublisher(publisher, lambda: {'info': {'summary': 'Summary'}}, flush_count=4,
+                                     flush_interval=60)
+    with mock.patch.object(publisher, '_send_data', side_effect=send_data):
+        background.start()
+        for test in make_tests(4):
+            background.put(test)
+        assert background.close() == 'JIRA-1000'
+    assert len(posted) == 3
+    assert 'testExecutionKey' not in posted[0]
+    assert posted[2] == {'info': {'summary': 'Summary'}, 'testExecutionKey': 'JIRA-1000', 'tests': make_tests(4)[2:]}
+    # the chunk uploaded before the error is not sent again
+    assert [test for upload in (posted[0], posted[2]) for test in upload['tests']] == make_tests(4)
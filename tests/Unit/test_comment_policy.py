@@ -0,0 +1,64 @@
+from _pytest.reports import TestReport
+import pytest
+
+from pytest_jira_xray.comment_policy import TRUNCATION_MARKER, CommentPolicy
+
+
+@pytest.mark.parametrize('truncation,expected', [
+    ('head', 'abcdefghij' + TRUNCATION_MARKER),
+    ('tail', TRUNCATION_MARKER + 'qrstuvwxyz'),
+    ('both', 'abcde' + TRUNCATION_MARKER + 'vwxyz'),
+])
+def test_truncate(truncation, expected):
+    policy = CommentPolicy(max_length=10 + len(TRUNCATION_MARKER), truncation=truncation)
+    assert policy.truncate('abcdefghijklmnopqrstuvwxyz') == expected
+    assert policy.truncate('short') == 'short'
+
+
+@pytest.mark.parametrize('truncation,expected', [
+    ('head', 'aé' + TRUNCATION_MARKER),
+    ('tail', TRUNCATION_MARKER + '€z'),
+    ('both', 'a' + TRUNCATION_MARKER + 'z'),
+])
+def test_truncate_counts_bytes(truncation, expected):
+    # 13 bytes UTF-8 encoded, é takes 2 bytes and € takes 3
+    policy = CommentPolicy(max_length=4 + len(TRUNCATION_MARKER), truncation=truncation)
+    assert policy.truncate('aé€€€z') == expected
+    assert policy.truncate('aéé') == 'aéé'
+
+
+@pytest.mark.parametrize('truncation', ['head', 'tail', 'both'])
+def test_truncate_again_keeps_marker_whole(truncation):
+    policy = CommentPolicy(max_length=5 + len(TRUNCATION_MARKER), truncation=truncation)
+    truncated = policy.truncate('a€€€€€€€€b')
+    assert len(truncated.encode('utf-8')) < policy.max_length
+    text = policy.truncate(f'{truncated}\nc')
+    assert text.count('[...]') == 1
+    assert TRUNCATION_MARKER in text
+    assert len(text.encode('utf-8')) <= policy.max_length
+
+
+@pytest.mark.parametrize('truncation', ['head', 'tail', 'both'])
+def test_render_is_bounded(truncation):
+    policy = CommentPolicy(max_length=100, truncation=truncation)
+    lines = '\n'.join(f'line {i}' for i in range(100_000))
+    report = TestReport('test_a.py::test_a', ('test_a.py', 1, 'test_a'), {}, 'failed', lines, 'call')
+    text = policy.render(report)
+    assert len(text) <= 100
+    assert TRUNCATION_MARKER in text
+    assert text.startswith('line 0') is (truncation != 'tail')
+    assert text.endswith('line 99999') is (truncation != 'head')
+
+
+def test_render_keeps_short_text():
+    report = TestReport('test_a.py::test_a', ('test_a.py', 1, 'test_a'), {}, 'failed', '  error\n', 'call')
+    assert CommentPolicy().render(report) == 'error'
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        CommentPolicy(truncation='middle')
+    with pytest.raises(ValueError):
+        CommentPolicy(tb_style='verbose')
+    with pytest.raises(ValueError):
+        CommentPolicy(max_length=len(TRUNCATION_MARKER) - 1)
@@ -0,0 +1,85 @@
+import base64
+import json
+from unittest import mock
+
+import pytest
+
+from pytest_jira_xray.evidence import EvidenceSpool, SpooledEvidence, json_default
+from pytest_jira_xray.xray_result import XrayEvidence
+
+
+def test_evidence_is_encoded_in_chunks(tmp_path):
+    content = bytes(range(256)) * 4000  # spans several read chunks
+    source = tmp_path / 'dump.bin'
+    source.write_bytes(content)
+    spool = EvidenceSpool(str(tmp_path / 'spool'))
+    (tmp_path / 'spool').mkdir()
+    assert spool.add('test_a.py::test_a', source)
+    [(path, filename, content_type)] = spool.pop('test_a.py::test_a')
+    assert (filename, content_type) == ('dump.bin', 'application/octet-stream')
+    assert SpooledEvidence(path).read() == base64.b64encode(content).decode()
+    assert spool.pop('test_a.py::test_a') == []
+
+
+def test_identical_evidence_is_stored_once():
+    spool = EvidenceSpool()
+    spool.add('test_a.py::test_a', b'same content', filename='a.txt')
+    spool.add('test_a.py::test_b', b'same content', filename='b.txt')
+    spool.add('test_a.py::test_b', b'other content', filename='c.txt')
+    [(first, _, content_type)] = spool.pop('test_a.py::test_a')
+    assert content_type == 'text/plain'
+    assert [path for path, _, _ in spool.pop('test_a.py::test_b')][0] == first
+    assert len(list(spool.directory.iterdir())) == 2
+    assert spool.run_size == len(b'same content') + len(b'other content')
+    directory = spool.directory
+    spool.close()
+    assert not directory.exists()
+
+
+def test_evidence_above_budget_is_dropped():
+    spool = EvidenceSpool(max_test_size=10, max_run_size=15)
+    assert spool.add('test_a.py::test_a', b'x' * 8, filename='a.txt')
+    with pytest.warns(pytest.PytestWarning, match='per test'):
+        assert not spool.add('test_a.py::test_a', b'y' * 8, filename='b.txt')
+    with pytest.warns(pytest.PytestWarning, match='per run'):
+        assert not spool.add('test_a.py::test_b', b'z' * 8, filename='c.txt')
+    assert [filename for _, filename, _ in spool.pop('test_a.py::test_a')] == ['a.txt']
+    spool.close()
+
+
+def test_evidence_bytes_require_file_name():
+    with pytest.raises(ValueError):
+        EvidenceSpool().add('test_a.py::test_a', b'content')
+
+
+def test_spooled_evidence_is_spliced_into_json(tmp_path):
+    spooled = tmp_path / 'data.b64'
+    spooled.write_text('ZGF0YQ==')
+    evidence = XrayEvidence(SpooledEvidence(str(spooled)), 'data.txt', 'text/plain')
+    assert json.loads(json.dumps(evidence.to_json(), default=json_default)) == {
+        'data': 'ZGF0YQ==', 'filename': 'data.txt', 'contentType': 'text/plain'}
+    with pytest.raises(TypeError):
+        json_default(object())
+
+
+def test_identical_evidence_is_encoded_once(tmp_path):
+    source = tmp_path / 'environment.txt'
+    source.write_text('PYTHON=3.9')
+    spool = EvidenceSpool()
+    with mock.patch.object(spool, '_encode', wraps=spool._encode) as encode, \
+            mock.patch('builtins.open', wraps=open) as opened:
+        for i in range(10):
+            spool.add(f'test_a.py::test_{i}', source)
+        source_opens = [call for call in opened.call_args_list if call.args[0] == source]
+        assert len(source_opens) == 2  # hashed once and encoded once
+        spool.add('test_a.py::test_bytes', b'PYTHON=3.9', filename='environment.txt')
+    encode.assert_called_once()
+    assert spool.run_size == len('PYTHON=3.9')
+    spool.close()
+
+
+def test_duplicates_do_not_count_towards_run_budget():
+    spool = EvidenceSpool(max_run_size=10)
+    for i in range(5):
+        assert spool.add(f'test_a.py::test_{i}', b'x' * 8, filename='a.txt')
+    spool.close()
@@ -1,7 +1,13 @@
+import bz2
+import gzip
 import json
+import lzma
+import os
+import stat
 from pathlib import Path, PurePosixPath
 
 from pytest_jira_xray.file_publisher import FilePublisher
+from pytest_jira_xray.serializer import JsonSerializer
 import pytest
 
 
@@ -42,3 +48,89 @@ def test_file_publisher_with_bad_data(test_data, tmp_path_factory):
         file_name = "report.json"
         file_publisher = FilePublisher(file_name)
         file_publisher.publish(test_data)
+
+
+@pytest.mark.parametrize('tests', [[], [{"testKey": "JIRA-1", "status": "PASS"}],
+                                   [{"testKey": "JIRA-1", "status": "PASS"}, {"testKey": "JIRA-2", "status": "FAIL"}]])
+def test_file_publisher_streams_tests(tests):
+    file_name = "report.json"
+    file_publisher = FilePublisher(file_name)
+    file_publisher.stream_start()
+    for test in tests:
+        file_publisher.stream_test(test)
+    file_publisher.stream_finish({"testExecutionKey": "JIRA-3", "info": {"testPlanKey": "JIRA-4"}})
+    with open(file_name) as data:
+        assert json.load(data) == {"tests": tests, "testExecutionKey": "JIRA-3", "info": {"testPlanKey": "JIRA-4"}}
+
+
+def test_file_publisher_stream_is_atomic():
+    file_name = "report.json"
+    file_publisher = FilePublisher(file_name)
+    file_publisher.stream_start()
+    file_publisher.stream_test({"testKey": "JIRA-1", "status": "PASS"})
+    assert not Path(file_name).exists()
+    assert len(list(Path().glob('.report.json.*.tmp'))) == 1
+    file_publisher.stream_finish({})
+    assert Path(file_name).exists()
+    assert not list(Path().glob('.report.json.*.tmp'))
+
+
+def test_file_publisher_keeps_previous_report_on_error():
+    file_name = "report.json"
+    file_publisher = FilePublisher(file_name)
+    file_publisher.publish({"tests": []})
+    with pytest.raises(TypeError):
+        file_publisher.publish({"tests": [Path("bad_data")]})
+    with open(file_name) as data:
+        assert json.load(data) == {"tests": []}
+    assert not list(Path().glob('.report.json.*.tmp'))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('file_name,opener', [('report.json', open), ('report.json.gz', gzip.open),
+                                              ('report.json.bz2', bz2.open), ('report.json.xz', lzma.open)])
+@pytest.mark.parametrize('stream', [False, True])
+def test_file_publisher_output_modes(file_name, opener, compact, stream):
+    test_data = {"tests": [{"testKey": "JIRA-1", "status": "PASS"}], "testExecutionKey": "JIRA-2"}
+    file_publisher = FilePublisher(file_name, compact=compact)
+    if stream:
+        file_publisher.stream_start()
+        file_publisher.stream_test(test_data["tests"][0])
+        file_publisher.stream_finish({"testExecutionKey": "JIRA-2"})
+    else:
+        file_publisher.publish(test_data)
+    with opener(file_name, 'rt') as data:
+        text = data.read()
+    assert json.loads(text) == test_data
+    assert (' ' not in text) is compact
+
+
+def test_file_publisher_writes_encoded_tests(tmp_path):
+    file_path = tmp_path / 'report.json'
+    test_data = {"testExecutionKey": "JIRA-2", "tests": [{"testKey": "JIRA-1", "status": "PASS"}]}
+    file_publisher = FilePublisher(str(file_path), compact=True)
+    serializer = JsonSerializer()
+    file_publisher.publish_encoded({"testExecutionKey": "JIRA-2"},
+                                   (serializer.dumps(test) for test in test_data["tests"]))
+    assert file_path.read_bytes() == serializer.dumps(test_data)
+    with pytest.raises(ValueError):
+        FilePublisher(str(file_path)).publish_encoded({}, [])
+
+
+def test_file_publisher_aborts_stream(tmp_path):
+    file_path = tmp_path / 'report.json.gz'
+    file_publisher = FilePublisher(str(file_path))
+    file_publisher.stream_start()
+    file_publisher.stream_test({"testKey": "JIRA-1", "status": "PASS"})
+    file_publisher.stream_abort()
+    file_publisher.stream_abort()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_file_publisher_respects_umask(tmp_path):
+    umask = os.umask(0o027)
+    try:
+        FilePublisher(str(tmp_path / 'report.json')).publish({})
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE((tmp_path / 'report.json').stat().st_mode) == 0o640
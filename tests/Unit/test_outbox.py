@@ -0,0 +1,82 @@
+import json
+from unittest import mock
+
+import pytest
+
+from pytest_jira_xray.exceptions import XrayError
+from pytest_jira_xray.outbox import XrayOutbox
+from pytest_jira_xray.xray_publisher import XrayPublisher
+
+DC_ENDPOINT = '/rest/raven/2.0/import/execution'
+
+
+def make_publisher(outbox, failing_keys, **kwargs):
+    publisher = XrayPublisher('http://localhost', DC_ENDPOINT, None, outbox=outbox, **kwargs)
+
+    def send_data(url, auth, body):
+        if any(test['testKey'] in failing_keys for test in json.loads(body)['tests']):
+            raise ValueError('ConnectionError: cannot connect to JIRA service')
+        return {'testExecIssue': {'key': 'JIRA-1000'}}
+
+    return publisher, mock.patch.object(publisher, '_send_data', side_effect=send_data)
+
+
+def test_outbox_is_empty_without_directory(tmp_path):
+    outbox = XrayOutbox(tmp_path / 'outbox')
+    assert len(outbox) == 0
+    assert outbox.replay(XrayPublisher('http://localhost', DC_ENDPOINT, None)) == {}
+
+
+def test_outbox_keeps_spool_order(tmp_path):
+    outbox = XrayOutbox(tmp_path)
+    paths = [outbox.put({'tests': [{'testKey': f'JIRA-{i}'}]}) for i in range(5)]
+    assert outbox.paths() == paths
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_failed_report_is_spooled_whole(tmp_path):
+    outbox = XrayOutbox(tmp_path)
+    data = {'info': {'summary': 'Summary'}, 'tests': [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(3)]}
+    publisher, send_data = make_publisher(outbox, {'JIRA-0'}, chunk_size=2)
+    with send_data, pytest.raises(XrayError, match='spooled'):
+        publisher.publish(data)
+    [path] = outbox.paths()
+    assert json.loads(path.read_text()) == data
+
+
+def test_failed_chunks_are_spooled(tmp_path):
+    outbox = XrayOutbox(tmp_path)
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(5)]
+    publisher, send_data = make_publisher(outbox, {'JIRA-1', 'JIRA-3'}, chunk_size=1)
+    with send_data, pytest.raises(XrayError, match='Could not upload 2 chunk'):
+        publisher.publish({'tests': tests})
+    assert [json.loads(path.read_text()) for path in outbox.paths()] == [
+        {'testExecutionKey': 'JIRA-1000', 'tests': [tests[1]]},
+        {'testExecutionKey': 'JIRA-1000', 'tests': [tests[3]]},
+    ]
+
+
+def test_replay_removes_uploaded_requests(tmp_path):
+    outbox = XrayOutbox(tmp_path)
+    first = outbox.put({'testExecutionKey': 'JIRA-1000', 'tests': [{'testKey': 'JIRA-1'}]})
+    second = outbox.put({'testExecutionKey': 'JIRA-1000', 'tests': [{'testKey': 'JIRA-2'}]})
+    publisher, send_data = make_publisher(None, {'JIRA-2'})
+    with send_data:
+        results = outbox.replay(publisher)
+    assert results[first.name] == 'JIRA-1000'
+    assert isinstance(results[second.name], ValueError)
+    # without an outbox of its own the publisher cannot spool the failure again, it is kept
+    assert outbox.paths() == [second]
+
+
+def test_replay_keeps_only_failed_chunks_in_place(tmp_path):
+    outbox = XrayOutbox(tmp_path)
+    first = outbox.put({'testExecutionKey': 'JIRA-1000', 'tests': [{'testKey': f'JIRA-{i}'} for i in range(4)]})
+    second = outbox.put({'testExecutionKey': 'JIRA-1000', 'tests': [{'testKey': 'JIRA-5'}]})
+    publisher, send_data = make_publisher(outbox, {'JIRA-2', 'JIRA-5'}, chunk_size=1)
+    with send_data:
+        outbox.replay(publisher)
+    # the failures keep their names and so their order, the publisher does not spool them again
+    assert outbox.paths() == [first, second]
+    assert json.loads(first.read_text()) == {'testExecutionKey': 'JIRA-1000', 'tests': [{'testKey': 'JIRA-2'}]}
+    assert publisher.outbox is outbox
@@ -0,0 +1,30 @@
+import json
+from unittest import mock
+
+from pytest_jira_xray.payload import XrayPayload
+from pytest_jira_xray.serializer import JsonSerializer
+
+
+def make_payload(count):
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'PASS' if i % 2 else 'FAIL'} for i in range(count)]
+    return XrayPayload({'testExecutionKey': 'JIRA-1000'}, tests, JsonSerializer())
+
+
+def test_payload_encodes_tests_as_they_are_taken():
+    payload = make_payload(4)
+    first_test = payload.serializer.dumps(payload.tests[0])
+    with mock.patch.object(payload.serializer, 'dumps', wraps=payload.serializer.dumps) as dumps:
+        encoded_tests = payload.encoded_tests()
+        assert dumps.call_count == 0
+        assert next(encoded_tests) == first_test
+        assert dumps.call_count == 1
+    assert json.loads(payload.encode()) == payload.to_json()
+
+
+def test_payload_selection():
+    payload = make_payload(4)
+    selected = payload.select(lambda test: test['status'] == 'PASS')
+    assert selected.header is payload.header
+    assert selected.tests == [payload.tests[1], payload.tests[3]]
+    assert list(selected.encoded_tests()) == [payload.serializer.dumps(test) for test in selected.tests]
+    assert make_payload(4).select(lambda test: False).to_json() == {'testExecutionKey': 'JIRA-1000', 'tests': []}
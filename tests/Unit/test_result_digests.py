@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from pytest_jira_xray.evidence import SpooledEvidence
+from pytest_jira_xray.result_digests import ResultDigests, result_digest
+
+
+class MemoryCache(dict):
+
+    def get(self, key, default):
+        return super().get(key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+
+def test_digest_ignores_start_and_finish():
+    test = {'testKey': 'JIRA-1', 'status': 'PASS', 'start': datetime(2022, 1, 1), 'finish': datetime(2022, 1, 2)}
+    assert result_digest(test) == result_digest({**test, 'start': datetime(2023, 1, 1), 'finish': None})
+    assert result_digest(test) != result_digest({**test, 'status': 'FAIL'})
+    assert result_digest(test) != result_digest({**test, 'comment': 'Flaky'})
+
+
+def test_digest_of_spooled_evidence_does_not_read_it():
+    evidence = [{'data': SpooledEvidence('/nonexistent/0123abcd.b64'), 'filename': 'log.txt'}]
+    assert result_digest({'testKey': 'JIRA-1', 'evidence': evidence})
+
+
+@pytest.mark.parametrize('saved_to,expected', [('JIRA-1000', {'JIRA-1': 'old', 'JIRA-2': 'new'}),
+                                               ('JIRA-2000', {'JIRA-2': 'new'})])
+def test_digests_are_saved_for_uploaded_execution(saved_to, expected):
+    cache = MemoryCache({'xray/digests/JIRA-1000': {'JIRA-1': 'old'}})
+    digests = ResultDigests(cache, 'JIRA-1000')
+    digests.current['JIRA-2'] = 'new'
+    digests.save(saved_to)
+    assert cache[f'xray/digests/{saved_to}'] == expected
+
+
+def test_unchanged_results_are_counted():
+    cache = MemoryCache()
+    first = ResultDigests(cache, 'JIRA-1000')
+    tests = [{'testKey': 'JIRA-1', 'status': 'PASS'}, {'testKey': 'JIRA-2', 'status': 'FAIL'}, {'status': 'PASS'}]
+    assert not any(first.is_unchanged(test) for test in tests)
+    first.save('JIRA-1000')
+    second = ResultDigests(cache, 'JIRA-1000')
+    assert [second.is_unchanged(test) for test in tests] == [True, True, False]
+    assert second.skipped == 2
+    assert not ResultDigests(cache, 'JIRA-2000').is_unchanged(tests[0])
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from pytest_jira_xray.evidence import SpooledEvidence
+from pytest_jira_xray.serializer import JsonSerializer, join_report
+
+
+def installed_backends():
+    backends = ['json']
+    for backend in ('orjson', 'ujson'):
+        try:
+            JsonSerializer(backend)
+        except ImportError:
+            continue
+        backends.append(backend)
+    return backends
+
+
+@pytest.mark.parametrize('backend', installed_backends())
+def test_serializer_encodes_same_json_with_every_backend(backend, tmp_path):
+    spool_file = tmp_path / 'evidence.b64'
+    spool_file.write_text('ZXZpZGVuY2U=', encoding='ascii')
+    data = {'testKey': 'JIRA-1', 'comment': 'Ünïcode / "quoted"\n', 'evidence': [SpooledEvidence(str(spool_file))]}
+    serializer = JsonSerializer(backend)
+    expected = {**data, 'evidence': ['ZXZpZGVuY2U=']}
+    compact = serializer.dumps(data)
+    assert isinstance(compact, bytes)
+    assert json.loads(compact) == expected
+    assert b'\n' not in compact
+    assert compact == JsonSerializer('json').dumps(data)
+    assert json.loads(serializer.dumps(data, indent=True)) == expected
+    assert b'\n  "testKey": "JIRA-1"' in serializer.dumps(data, indent=True)
+
+
+@pytest.mark.parametrize('backend', installed_backends())
+def test_serializer_rejects_unknown_objects(backend, tmp_path):
+    with pytest.raises(TypeError):
+        JsonSerializer(backend).dumps({'data': tmp_path})
+
+
+def test_serializer_prefers_installed_backend():
+    installed = installed_backends()
+    assert JsonSerializer().backend == next(backend for backend in ('orjson', 'ujson', 'json') if backend in installed)
+    with pytest.raises(ValueError):
+        JsonSerializer('simplejson')
+
+
+@pytest.mark.parametrize('header', [{}, {'testExecutionKey': 'JIRA-1000', 'info': {'summary': 'Summary'}}])
+@pytest.mark.parametrize('count', [0, 1, 3])
+def test_join_report(header, count):
+    serializer = JsonSerializer()
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(count)]
+    joined = join_report(serializer.dumps(header), (serializer.dumps(test) for test in tests))
+    assert joined == serializer.dumps({**header, 'tests': tests})
@@ -0,0 +1,90 @@
+from _pytest.reports import TestReport
+import pytest
+
+from pytest_jira_xray.constants import MAX_COMMENT_LENGTH
+from pytest_jira_xray.xray_accumulator import XrayTestAccumulator
+
+
+def make_report(when, outcome='passed', longrepr=None, duration=1.0, **extra):
+    return TestReport('test_a.py::test_a', ('test_a.py', 1, 'test_a'), {}, outcome, longrepr, when,
+                      duration=duration, **extra)
+
+
+def test_accumulator_folds_passed_phases():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('setup', test_keys=['JIRA-1']))
+    accumulator.add(make_report('call'))
+    accumulator.add(make_report('teardown'))
+    assert accumulator.outcome == 'passed'
+    assert accumulator.failure_when is None
+    assert accumulator.test_keys == ['JIRA-1']
+    assert accumulator.duration == pytest.approx(3.0)
+    assert accumulator.text == ''
+
+
+@pytest.mark.parametrize('failing_phase', ['setup', 'call', 'teardown'])
+def test_accumulator_keeps_first_failure(failing_phase):
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    for when in ('setup', 'call', 'teardown'):
+        outcome = 'failed' if when == failing_phase else 'passed'
+        accumulator.add(make_report(when, outcome, longrepr=f'{when} error' if outcome == 'failed' else None))
+    assert accumulator.outcome == 'failed'
+    assert accumulator.failure_when == failing_phase
+    assert accumulator.text == f'{failing_phase} error'
+
+
+def test_accumulator_uses_skip_reason():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('setup', 'skipped', longrepr=('test_a.py', 1, 'Skipped: reason')))
+    assert accumulator.outcome == 'skipped'
+    assert accumulator.text == 'Skipped: reason'
+
+
+def test_accumulator_joins_texts_of_phases():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('call', 'failed', longrepr='call error'))
+    accumulator.add(make_report('teardown', 'failed', longrepr='teardown error'))
+    assert accumulator.text == 'call error\nteardown error'
+
+
+def test_accumulator_truncates_text():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('call', 'failed', longrepr='x' * (MAX_COMMENT_LENGTH + 10)))
+    accumulator.add(make_report('teardown', 'failed', longrepr='y' * 10))
+    assert len(accumulator.text) == MAX_COMMENT_LENGTH
+    assert 'y' not in accumulator.text
+
+
+def test_accumulator_ignores_reruns():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('call', 'rerun', longrepr='error'))
+    assert accumulator.outcome == 'passed'
+    assert accumulator.duration == 0.0
+
+
+def test_accumulator_records_rerun_attempts():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('setup'))
+    accumulator.add(make_report('call', 'rerun', longrepr='call error', duration=2.0))
+    accumulator.add(make_report('setup', 'rerun', longrepr='setup error'))
+    for when in ('setup', 'call', 'teardown'):
+        accumulator.add(make_report(when))
+    assert accumulator.outcome == 'passed'
+    assert accumulator.text == ''
+    assert accumulator.attempts == 3
+    assert accumulator.reruns == [['call', 3.0], ['setup', 1.0]]
+    assert accumulator.duration == pytest.approx(3.0)
+    restored = XrayTestAccumulator.from_serializable(accumulator.nodeid, accumulator.to_serializable())
+    assert restored == accumulator
+
+
+def test_accumulator_spans_phases_and_attempts():
+    accumulator = XrayTestAccumulator('test_a.py::test_a')
+    accumulator.add(make_report('setup', start=100.5, stop=101.0))
+    accumulator.add(make_report('call', 'rerun', longrepr='call error', start=101.0, stop=102.0))
+    for start, when in enumerate(('setup', 'call', 'teardown'), start=103):
+        accumulator.add(make_report(when, start=start, stop=start + 0.5))
+    accumulator.add(make_report('teardown'))
+    assert (accumulator.start, accumulator.stop) == (100.5, 105.5)
+    restored = XrayTestAccumulator.from_serializable(accumulator.nodeid, accumulator.to_serializable())
+    assert restored == accumulator
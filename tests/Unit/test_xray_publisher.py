@@ -0,0 +1,245 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import time
+from unittest import mock
+
+from flask import jsonify, request
+import pytest
+
+from pytest_jira_xray.exceptions import XrayError
+from pytest_jira_xray.xray_publisher import ClientSecretAuth, XrayPublisher
+
+DC_ENDPOINT = '/rest/raven/2.0/import/execution'
+
+
+@pytest.fixture
+def jira_server(mock_server):
+    mock_server.add_json_response(DC_ENDPOINT, {'testExecIssue': {'key': 'JIRA-1000'}}, methods=('POST',))
+    mock_server.add_callback_response('/api/v2/authenticate', lambda: '"dummy_token"', methods=('POST',))
+
+    def slow_import():
+        time.sleep(0.5)
+        return jsonify({'key': 'JIRA-1000'})
+
+    mock_server.add_callback_response('/slow', slow_import, methods=('POST',))
+    mock_server.start()
+    return mock_server
+
+
+def test_publisher_reuses_session(jira_server):
+    publisher = XrayPublisher(jira_server.url, DC_ENDPOINT, ('user', 'password'))
+    with mock.patch('requests.request') as module_request, \
+            mock.patch.object(publisher.session, 'send', wraps=publisher.session.send) as send:
+        for _ in range(5):
+            assert publisher.publish({'tests': []}) == 'JIRA-1000'
+    publisher.close()
+    assert send.call_count == 5
+    module_request.assert_not_called()
+
+
+def test_client_secret_auth_shares_publisher_session(jira_server):
+    auth = ClientSecretAuth(jira_server.url, 'client_id', 'client_secret')
+    publisher = XrayPublisher(jira_server.url, DC_ENDPOINT, auth)
+    assert auth.session is publisher.session
+    with mock.patch.object(publisher.session, 'send', wraps=publisher.session.send) as send:
+        for _ in range(2):
+            publisher.publish({'tests': []})
+    publisher.close()
+    assert send.call_count == 3  # a single authentication for both imports
+
+
+def test_publisher_pool_size(jira_server):
+    publisher = XrayPublisher(jira_server.url, DC_ENDPOINT, ('user', 'password'), pool_size=3)
+    adapter = publisher.session.get_adapter(jira_server.url)
+    assert adapter._pool_maxsize == 3
+
+
+def test_publisher_raises_on_timeout(jira_server):
+    publisher = XrayPublisher(jira_server.url, '/slow', ('user', 'password'), timeout=0.1)
+    with pytest.raises(ValueError, match='cannot connect'):
+        publisher.publish({'tests': []})
+
+
+def test_publisher_raises_on_connection_error(mock_server):
+    publisher = XrayPublisher(mock_server.url, DC_ENDPOINT, ('user', 'password'), retries=0)
+    with pytest.raises(ValueError, match='ConnectionError'):
+        publisher.publish({'tests': []})
+
+
+@pytest.mark.parametrize('status, expected_requests', [(429, 3), (503, 3), (502, 1), (504, 1)])
+def test_publisher_retries_only_unprocessed_requests(mock_server, status, expected_requests):
+    received = []
+
+    def import_execution():
+        received.append(request.method)
+        return jsonify({'error': 'Unavailable'}), status
+
+    mock_server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    mock_server.start()
+    publisher = XrayPublisher(mock_server.url, DC_ENDPOINT, ('user', 'password'), retries=2)
+    with mock.patch('urllib3.util.retry.Retry.sleep'), pytest.raises(ValueError, match=str(status)):
+        publisher.publish({'tests': []})
+    assert received == ['POST'] * expected_requests
+
+
+def make_jwt(expires: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': expires}).encode()).decode().rstrip('=')
+    return f'header.{payload}.signature'
+
+
+@pytest.fixture
+def auth_server(mock_server):
+    issued_tokens = []
+    token_lifetime = [3600]
+
+    def authenticate():
+        issued_tokens.append(make_jwt(time.time() + token_lifetime[0]))
+        return f'"{issued_tokens[-1]}"'
+
+    def import_execution():
+        if request.headers['Authorization'] != f'Bearer {issued_tokens[-1]}':
+            return jsonify({'error': 'Unauthorized'}), 401
+        return jsonify({'key': 'JIRA-1000'})
+
+    mock_server.add_callback_response('/api/v2/authenticate', authenticate, methods=('POST',))
+    mock_server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    mock_server.start()
+    mock_server.issued_tokens = issued_tokens
+    mock_server.token_lifetime = token_lifetime
+    return mock_server
+
+
+def test_client_secret_auth_authenticates_once(auth_server):
+    auth = ClientSecretAuth(auth_server.url, 'client_id', 'client_secret')
+    publisher = XrayPublisher(auth_server.url, DC_ENDPOINT, auth)
+    for _ in range(10):
+        assert publisher.publish({'tests': []}) == 'JIRA-1000'
+    assert len(auth_server.issued_tokens) == 1
+
+
+def test_client_secret_auth_refreshes_once_under_lock(auth_server):
+    auth = ClientSecretAuth(auth_server.url, 'client_id', 'client_secret')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = set(executor.map(lambda _: auth.get_token(), range(32)))
+    assert len(tokens) == 1
+    assert len(auth_server.issued_tokens) == 1
+
+
+def test_client_secret_auth_refreshes_expiring_token(auth_server):
+    auth_server.token_lifetime[0] = 30
+    auth = ClientSecretAuth(auth_server.url, 'client_id', 'client_secret')
+    auth.get_token()
+    auth.get_token()
+    assert len(auth_server.issued_tokens) == 2
+
+
+def test_client_secret_auth_invalidates_token_on_401(auth_server):
+    auth = ClientSecretAuth(auth_server.url, 'client_id', 'client_secret')
+    publisher = XrayPublisher(auth_server.url, DC_ENDPOINT, auth)
+    publisher.publish({'tests': []})
+    auth_server.issued_tokens.append('revoked')  # the cached token is no longer accepted by the server
+    assert publisher.publish({'tests': []}) == 'JIRA-1000'
+    assert len(auth_server.issued_tokens) == 3
+    assert publisher.publish({'tests': []}) == 'JIRA-1000'
+    assert len(auth_server.issued_tokens) == 3
+
+
+def test_client_secret_auth_shares_token_cache_file(auth_server, tmp_path):
+    cache = tmp_path / 'token.json'
+    first = ClientSecretAuth(auth_server.url, 'client_id', 'client_secret', token_cache=str(cache))
+    second = ClientSecretAuth(auth_server.url, 'client_id', 'client_secret', token_cache=str(cache))
+    assert first.get_token() == second.get_token()
+    assert len(auth_server.issued_tokens) == 1
+    other_client = ClientSecretAuth(auth_server.url, 'other_id', 'client_secret', token_cache=str(cache))
+    other_client.get_token()
+    assert len(auth_server.issued_tokens) == 2
+
+
+@pytest.mark.parametrize('chunk_size,chunk_bytes,expected', [
+    (0, None, [5]),
+    (2, None, [2, 2, 1]),
+    (5, None, [5]),
+    (0, 74, [2, 2, 1]),
+    (3, 74, [2, 2, 1]),
+    (0, 73, [1, 1, 1, 1, 1]),
+])
+def test_publisher_splits_tests_into_chunks(chunk_size, chunk_bytes, expected):
+    publisher = XrayPublisher('http://localhost', DC_ENDPOINT, None, chunk_size=chunk_size, chunk_bytes=chunk_bytes)
+    sent = []
+
+    def send_data(url, auth, body):
+        sent.append(json.loads(body))
+        return {'testExecIssue': {'key': 'JIRA-1000'}}
+
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(5)]
+    with mock.patch.object(publisher, '_send_data', side_effect=send_data):
+        assert publisher.publish({'info': {'summary': 'Summary'}, 'tests': tests}) == 'JIRA-1000'
+    assert [len(data['tests']) for data in sent] == expected
+    assert [test for data in sent for test in data['tests']] == tests
+    assert sent[0]['info'] == {'summary': 'Summary'}
+    assert all(data == {'testExecutionKey': 'JIRA-1000', 'tests': data['tests']} for data in sent[1:])
+
+
+def test_publisher_uploads_in_one_request_by_default():
+    publisher = XrayPublisher('http://localhost', DC_ENDPOINT, None)
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(1500)]
+    with mock.patch.object(publisher, '_send_data', return_value={'key': 'JIRA-1000'}) as send_data:
+        assert publisher.publish({'tests': tests}) == 'JIRA-1000'
+    assert send_data.call_count == 1
+    assert len(json.loads(send_data.call_args.args[2])['tests']) == 1500
+
+
+def test_publisher_sends_empty_report():
+    publisher = XrayPublisher('http://localhost', DC_ENDPOINT, None, chunk_size=2)
+    with mock.patch.object(publisher, '_send_data', return_value={'key': 'JIRA-1000'}) as send_data:
+        assert publisher.publish({'testExecutionKey': 'JIRA-1000', 'tests': []}) == 'JIRA-1000'
+    send_data.assert_called_once()
+
+
+@pytest.fixture
+def concurrency_server(mock_server):
+    state = {'in_flight': 0, 'max_in_flight': 0, 'imports': 0}
+    lock = threading.Lock()
+
+    def import_execution():
+        tests = request.get_json()['tests']
+        with lock:
+            state['imports'] += 1
+            state['in_flight'] += 1
+            state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        time.sleep(0.05)
+        with lock:
+            state['in_flight'] -= 1
+        if any(test['status'] == 'BROKEN' for test in tests):
+            return jsonify({'error': f"Cannot import {tests[0]['testKey']}"}), 400
+        return jsonify({'key': 'JIRA-1000'})
+
+    mock_server.add_callback_response(DC_ENDPOINT, import_execution, methods=('POST',))
+    mock_server.start()
+    mock_server.state = state
+    return mock_server
+
+
+@pytest.mark.parametrize('upload_workers', [1, 4])
+def test_publisher_uploads_chunks_concurrently(concurrency_server, upload_workers):
+    publisher = XrayPublisher(concurrency_server.url, DC_ENDPOINT, None, chunk_size=1, upload_workers=upload_workers)
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'PASS'} for i in range(13)]
+    assert publisher.publish({'tests': tests}) == 'JIRA-1000'
+    assert concurrency_server.state['imports'] == 13
+    assert concurrency_server.state['max_in_flight'] <= upload_workers
+    assert (concurrency_server.state['max_in_flight'] > 1) is (upload_workers > 1)
+
+
+@pytest.mark.parametrize('upload_workers', [1, 4])
+def test_publisher_reports_chunk_errors_in_order(concurrency_server, upload_workers):
+    publisher = XrayPublisher(concurrency_server.url, DC_ENDPOINT, None, chunk_size=1, upload_workers=upload_workers)
+    tests = [{'testKey': f'JIRA-{i}', 'status': 'BROKEN' if i in (7, 2) else 'PASS'} for i in range(9)]
+    with pytest.raises(XrayError) as error:
+        publisher.publish({'tests': tests})
+    assert concurrency_server.state['imports'] == 9
+    message = str(error.value)
+    assert message.startswith('Could not upload 2 chunk(s) to test execution JIRA-1000')
+    assert message.index('Chunk 3:') < message.index('Chunk 8:')
+    assert 'Cannot import JIRA-7' in message
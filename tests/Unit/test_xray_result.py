@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from pytest_jira_xray.helper import format_timestamp
+from pytest_jira_xray.xray_result import (
+    XrayEvidence,
+    XrayExecutionInfo,
+    XrayIteration,
+    XrayParameter,
+    XrayTest,
+    XrayTestInfo,
+)
+from pytest_jira_xray.xray_statuses import Status
+
+
+@pytest.mark.parametrize('result', [XrayTest(), XrayTestInfo(), XrayExecutionInfo()])
+def test_results_have_no_instance_dict(result):
+    assert not hasattr(result, '__dict__')
+    with pytest.raises(AttributeError):
+        result.unknown_attribute = None
+
+
+def test_empty_collections_are_shared():
+    assert XrayTest()._evidence is XrayTest()._evidence
+    assert XrayTestInfo()._requirement_keys is XrayTestInfo()._requirement_keys
+
+
+def test_collections_are_lists():
+    test = XrayTest(test_info=XrayTestInfo(), iterations=(XrayIteration(name='1'),))
+    test.evidence.append(XrayEvidence('cG5n', 'screenshot.png', 'image/png'))
+    test.iterations.append(XrayIteration(name='2'))
+    test.test_info.labels.append('label')
+    assert [iteration.name for iteration in test.iterations] == ['1', '2']
+    assert len(test.evidence) == 1 and test.test_info.labels == ['label']
+    assert not XrayTest().evidence and not XrayTestInfo().labels
+
+
+def test_add_leaves_empty_collections_unshared():
+    first = XrayTest(test_key='JIRA-1')
+    merged = first + XrayTest(test_key='JIRA-1', defects=['JIRA-4'])
+    assert merged.defects == ['JIRA-4']
+    assert first.defects == []
+
+
+def test_add_requirement_allocates_on_first_use():
+    first = XrayTest(test_info=XrayTestInfo(definition='test_a.py::test_a'))
+    second = XrayTest(test_info=XrayTestInfo(definition='test_a.py::test_b'))
+    first.add_requirement('JIRA-1', 'JIRA-2')
+    first.add_requirement('JIRA-3')
+    assert first.test_info.requirement_keys == ['JIRA-1', 'JIRA-2', 'JIRA-3']
+    assert not second.test_info.requirement_keys
+
+
+def test_to_json_output():
+    test = XrayTest(test_info=XrayTestInfo(definition='test_a.py::test_a', labels=['label']), comment='comment',
+                    defects=['JIRA-4'])
+    test.add_requirement('JIRA-1')
+    assert json.dumps(test.to_json()) == (
+        '{"testInfo": {"requirement_keys": ["JIRA-1"], "labels": ["label"], "definition": "test_a.py::test_a"}, '
+        '"comment": "comment", "status": "TODO", "defects": ["JIRA-4"]}'
+    )
+
+
+def test_add_merges_results_of_same_test():
+    first = XrayTest(test_key='JIRA-1', status=Status.PASS, comment='first', defects=['JIRA-4'])
+    second = XrayTest(test_key='JIRA-1', status=Status.FAIL, comment='second', defects=['JIRA-5'])
+    merged = first + second
+    assert merged.status is Status.FAIL
+    assert merged.comment == 'first\n----\nsecond'
+    assert merged.defects == ['JIRA-4', 'JIRA-5']
+    assert first.defects == ['JIRA-4']
+    assert first.status is Status.PASS
+
+
+def test_sum_and_in_place_merge():
+    tests = [XrayTest(test_key='JIRA-1', status=Status.PASS, examples=[str(i)]) for i in range(3)]
+    merged = sum(tests[1:], tests[0])
+    assert merged.examples == ['0', '1', '2']
+    assert sum(tests[:1]) is tests[0]
+    tests[0] += XrayTest(test_key='JIRA-1', status=Status.TODO)
+    assert tests[0].status is Status.TODO
+
+
+def test_merge_truncates_joined_comment():
+    merged = XrayTest(test_key='JIRA-1', comment='first')
+    merged.merge(XrayTest(test_key='JIRA-1', comment='second'), lambda comment: comment[-6:])
+    assert merged.comment == 'second'
+
+
+def test_add_rejects_other_tests():
+    with pytest.raises(ValueError):
+        XrayTest(test_key='JIRA-1') + XrayTest(test_key='JIRA-2')
+    with pytest.raises(TypeError):
+        XrayTest(test_key='JIRA-1') + 1
+
+
+def test_iteration_to_json():
+    iteration = XrayIteration(name='1-a', parameters=[XrayParameter('number', '1'), XrayParameter('letter', 'a')],
+                              status=Status.PASS)
+    assert json.dumps(XrayTest(test_key='JIRA-1', iterations=[iteration]).to_json()) == (
+        '{"testKey": "JIRA-1", "status": "TODO", "iterations": [{"name": "1-a", "parameters": '
+        '[{"name": "number", "value": "1"}, {"name": "letter", "value": "a"}], "status": "PASS"}]}'
+    )
+
+
+def test_add_keeps_evidence_once():
+    screenshot = XrayEvidence('cG5n', 'screenshot.png', 'image/png')
+    log = XrayEvidence('bG9n', 'test.log', 'text/plain')
+    merged = XrayTest(test_key='JIRA-1', evidence=[screenshot])
+    merged += XrayTest(test_key='JIRA-1', evidence=[XrayEvidence('cG5n', 'screenshot.png', 'image/png'), log])
+    assert merged.evidence == [screenshot, log]
+
+
+def test_merge_keeps_earliest_start_and_latest_finish():
+    # an hour apart across the end of daylight saving time, central European clocks read 02:00 at both starts
+    merged = XrayTest(test_key='JIRA-1', start=1667091600.0, finish=1667091700.0)
+    merged += XrayTest(test_key='JIRA-1', start=1667088000.0, finish=1667095300.0)
+    merged += XrayTest(test_key='JIRA-1')
+    assert (merged.start, merged.finish) == (1667088000.0, 1667095300.0)
+    xray_test = merged.to_json()
+    assert (xray_test['start'], xray_test['finish']) == (format_timestamp(1667088000.0), format_timestamp(1667095300.0))
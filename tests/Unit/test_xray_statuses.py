@@ -0,0 +1,42 @@
+import pytest
+
+from pytest_jira_xray.helper import _merge_status
+from pytest_jira_xray.xray_statuses import STATUS_HIERARCHY, Status, merge_statuses
+
+
+@pytest.mark.parametrize('status_1,status_2,expected', [
+    (Status.PASS, Status.PASS, Status.PASS),
+    (Status.PASS, Status.FAIL, Status.FAIL),
+    (Status.TODO, Status.PASS, Status.TODO),
+    (Status.TODO, Status.ABORTED, Status.ABORTED),
+    (Status.BLOCKED, Status.FAIL, Status.BLOCKED),
+    ('PASS', 'FAIL', Status.FAIL),
+])
+def test_merge_status(status_1, status_2, expected):
+    assert _merge_status(status_1, status_2) is expected
+    assert _merge_status(status_2, status_1) is expected
+
+
+def test_merge_statuses_picks_highest():
+    assert merge_statuses(STATUS_HIERARCHY) is Status.BLOCKED
+    assert merge_statuses(iter([Status.PASS, 'PENDING', Status.TODO])) is Status.PENDING
+    assert merge_statuses([Status.PASS]) is Status.PASS
+
+
+def test_merge_statuses_rejects_empty_input():
+    with pytest.raises(ValueError):
+        merge_statuses([])
+
+
+@pytest.mark.parametrize('statuses,expected', [
+    (['PASSED', 'FAILED'], 'FAILED'),
+    (['FAILED', 'PASSED'], 'FAILED'),
+    (['PASSED', 'PASSED'], 'PASSED'),
+    ([Status.PASS, 'PASSED'], Status.PASS),
+    (['FLAKY', Status.FAIL], 'FLAKY'),
+    (['FLAKY', 'WAIVED'], 'FLAKY'),
+    (['FLAKY', Status.ABORTED], Status.ABORTED),
+])
+def test_merge_unknown_statuses(statuses, expected):
+    assert merge_statuses(statuses) == expected
+    assert _merge_status(*statuses) == expected
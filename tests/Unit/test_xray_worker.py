@@ -0,0 +1,29 @@
+import json
+
+from _pytest.reports import TestReport
+
+from pytest_jira_xray.xray_accumulator import XrayTestAccumulator
+from pytest_jira_xray.xray_worker import XrayWorker
+
+
+def make_report(when, outcome='passed', longrepr=None, **extra):
+    return TestReport('test_a.py::test_a', ('test_a.py', 1, 'test_a'), {}, outcome, longrepr, when,
+                      duration=1.0, test_keys=['JIRA-1'], **extra)
+
+
+def test_worker_attaches_result_to_final_report():
+    worker = XrayWorker()
+    reports = [make_report('setup'), make_report('call', 'failed', 'error'), make_report('teardown')]
+    for report in reports:
+        worker.pytest_runtest_logreport(report)
+        assert not hasattr(report, 'test_keys')
+    assert reports[0].xray_result is None
+    assert reports[1].xray_result is None
+    assert not worker._accumulators
+
+    # travels to the controller inside the serialized report
+    data = json.loads(json.dumps(reports[2]._to_json()))
+    assert 'wasxfail' not in data['xray_result']
+    accumulator = XrayTestAccumulator.from_serializable(data['nodeid'], TestReport._from_json(data).xray_result)
+    assert accumulator == XrayTestAccumulator('test_a.py::test_a', test_keys=['JIRA-1'], outcome='failed',
+                                              failure_when='call', duration=3.0, text='error')
@@ -1,6 +1,8 @@
 import pytest
 from _pytest.pytester import Pytester
 
+from mock_server import MockServer
+
 pytest_plugins = "pytester"
 
 
@@ -10,6 +12,12 @@ def chdir(tmp_path_factory, monkeypatch):
     monkeypatch.chdir(base_dir)
 
 
+@pytest.fixture
+def mock_server() -> MockServer:
+    """Flask stand-in for the Jira server, register the responses before calling start()."""
+    return MockServer()
+
+
 @pytest.fixture
 def make_test_py_file(pytester: Pytester) -> callable:
     def _make_test_py_file(name, file_content):
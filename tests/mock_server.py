@@ -1,3 +1,5 @@
+import socket
+import time
 from threading import Thread
 from uuid import uuid4
 
@@ -5,11 +7,17 @@ import requests
 from flask import Flask, jsonify
 
 
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
 class MockServer(Thread):
 
-    def __init__(self, port=5000):
-        super().__init__()
-        self.port = port
+    def __init__(self, port=None):
+        super().__init__(daemon=True)
+        self.port = port or _free_port()
         self.app = Flask(__name__)
         self.url = f'http://localhost:{self.port}'
 
@@ -36,5 +44,18 @@ class MockServer(Thread):
 
         self.add_callback_response(url, callback, methods=methods)
 
+    def start(self, timeout=5.0):
+        """Start the server and wait until it accepts connections."""
+        super().start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(('localhost', self.port), timeout=0.1).close()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+
     def run(self):
         self.app.run(port=self.port)